@@ -1,25 +1,28 @@
 from flask import Flask, render_template, request, redirect, flash, session
-import re
-import random
-from datetime import datetime, timedelta
+from jinja2 import Template, FileSystemBytecodeCache
+import os
+import heapq
 from dotenv import load_dotenv
 import logging
+import atexit
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import ThreadPoolExecutor
 
 # Load environment variables
 load_dotenv()
 
-from config import TOPICS, FLASK_SECRET
+from config import TOPICS, TOPICS_SET, FLASK_SECRET
 from utils import (
     validate_email_address, 
-    validate_topics, 
     sanitize_input,
     simple_rate_limit,
     generate_secure_otp,
+    otp_expiry_iso,
     validate_otp_format,
     log_security_event
 )
 from sheets import (
-    upsert_subscriber,
     is_verified,
     set_pending_subscription,
     verify_otp,
@@ -30,91 +33,109 @@ from sheets import (
     deactivate_subscription,
     reactivate_subscription,
 )
-from news import fetch_news_perplexity, build_html
-from mailer import send_email
-from cache import cached_fetch_news_perplexity, cached_fetch_news_monthly
+from news import fetch_all_news, build_html_section, build_html_from_sections
+from mailer import send_email, queue_email
+from cache import (
+    cached_fetch_news_monthly_bulk,
+    get_cached_subscriber,
+    cache_subscriber,
+)
 from scheduler import start_scheduler
 
 app = Flask(__name__)
 app.secret_key = FLASK_SECRET
 
-# Configure logging
+# Keep compiled template bytecode on disk so workers skip recompiling pages,
+# and stop stat-ing template files on every render outside development
+app.jinja_options = {**app.jinja_options, "bytecode_cache": FileSystemBytecodeCache()}
+app.jinja_env.auto_reload = os.environ.get("FLASK_ENV") == "development"
+
+# Configure logging: request threads only enqueue records, a background
+# listener thread does the file/console writes
+_log_queue = queue.Queue(-1)
+_log_listener = QueueListener(
+    _log_queue,
+    logging.FileHandler('newsletter.log'),
+    logging.StreamHandler()
+)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('newsletter.log'),
-        logging.StreamHandler()
-    ]
+    handlers=[QueueHandler(_log_queue)],
+    force=True  # utils/scheduler already called basicConfig on import
 )
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logger = logging.getLogger(__name__)
 
-def create_verification_email(otp_code, purpose="subscription"):
-    """Create a professional verification email template"""
-    purpose_text = {
-        "subscription": {
-            "title": "Verify your newsletter subscription",
-            "heading": "Welcome to AI Newsletter! 🎉",
-            "message": "Thank you for subscribing! Please verify your email address to complete your subscription and start receiving personalized news updates.",
-            "button_text": "Verify Subscription"
-        },
-        "manage": {
-            "title": "Verify access to manage subscription",
-            "heading": "Verify Your Identity 🔐",
-            "message": "You requested access to manage your subscription preferences. Please verify your email address to continue.",
-            "button_text": "Access Management"
-        }
+# Pool for the homepage and /trending monthly fetches; they are I/O-bound so
+# overlap well. Perplexity digests use news.fetch_all_news's own pool
+_news_pool = ThreadPoolExecutor(max_workers=len(TOPICS))
+
+# Verification email copy per purpose; looked up on every OTP send
+_PURPOSE = {
+    "subscription": {
+        "title": "Verify your newsletter subscription",
+        "heading": "Welcome to AI Newsletter! 🎉",
+        "message": "Thank you for subscribing! Please verify your email address to complete your subscription and start receiving personalized news updates.",
+        "button_text": "Verify Subscription"
+    },
+    "manage": {
+        "title": "Verify access to manage subscription",
+        "heading": "Verify Your Identity 🔐",
+        "message": "You requested access to manage your subscription preferences. Please verify your email address to continue.",
+        "button_text": "Access Management"
     }
-    
-    content = purpose_text.get(purpose, purpose_text["subscription"])
-    
-    return f"""
+}
+
+# Compiled once at import so each send only renders, never re-parses
+_VERIFY_TEMPLATE = Template("""
     <!DOCTYPE html>
     <html lang="en">
     <head>
         <meta charset="UTF-8">
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>{content['title']}</title>
+        <title>{{ title }}</title>
         <style>
-            * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-            body {{ font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Oxygen, Ubuntu, Cantarell, sans-serif; background-color: #f8fafc; }}
-            .container {{ max-width: 600px; margin: 0 auto; background-color: #ffffff; }}
-            .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 40px 30px; text-align: center; }}
-            .header h1 {{ color: #ffffff; font-size: 28px; font-weight: 700; margin-bottom: 8px; }}
-            .header p {{ color: #e2e8f0; font-size: 16px; }}
-            .content {{ padding: 40px 30px; }}
-            .message {{ color: #334155; font-size: 16px; line-height: 1.6; margin-bottom: 30px; }}
-            .code-container {{ background: linear-gradient(135deg, #f1f5f9 0%, #e2e8f0 100%); border-radius: 12px; padding: 30px; text-align: center; margin: 30px 0; border: 2px dashed #cbd5e1; }}
-            .code-label {{ color: #64748b; font-size: 14px; font-weight: 600; margin-bottom: 12px; text-transform: uppercase; letter-spacing: 0.5px; }}
-            .verification-code {{ font-size: 36px; font-weight: 800; color: #1e293b; font-family: 'Courier New', monospace; letter-spacing: 4px; margin: 12px 0; text-shadow: 0 2px 4px rgba(0,0,0,0.1); }}
-            .expiry {{ color: #64748b; font-size: 13px; margin-top: 12px; }}
-            .button {{ display: inline-block; background: linear-gradient(135deg, #3b82f6 0%, #8b5cf6 100%); color: #ffffff; text-decoration: none; padding: 16px 32px; border-radius: 8px; font-weight: 600; font-size: 16px; margin: 20px 0; box-shadow: 0 4px 12px rgba(59, 130, 246, 0.3); }}
-            .footer {{ background-color: #f8fafc; padding: 30px; text-align: center; border-top: 1px solid #e2e8f0; }}
-            .footer-text {{ color: #64748b; font-size: 14px; line-height: 1.5; }}
-            .footer-links {{ margin-top: 16px; }}
-            .footer-links a {{ color: #3b82f6; text-decoration: none; margin: 0 12px; font-size: 14px; }}
-            .security-notice {{ background-color: #fef3c7; border: 1px solid #fbbf24; border-radius: 8px; padding: 16px; margin: 20px 0; }}
-            .security-notice-text {{ color: #92400e; font-size: 14px; }}
-            @media (max-width: 600px) {{
-                .container {{ margin: 0; }}
-                .header, .content, .footer {{ padding: 20px; }}
-                .verification-code {{ font-size: 28px; letter-spacing: 2px; }}
-            }}
+            * { margin: 0; padding: 0; box-sizing: border-box; }
+            body { font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Oxygen, Ubuntu, Cantarell, sans-serif; background-color: #f8fafc; }
+            .container { max-width: 600px; margin: 0 auto; background-color: #ffffff; }
+            .header { background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 40px 30px; text-align: center; }
+            .header h1 { color: #ffffff; font-size: 28px; font-weight: 700; margin-bottom: 8px; }
+            .header p { color: #e2e8f0; font-size: 16px; }
+            .content { padding: 40px 30px; }
+            .message { color: #334155; font-size: 16px; line-height: 1.6; margin-bottom: 30px; }
+            .code-container { background: linear-gradient(135deg, #f1f5f9 0%, #e2e8f0 100%); border-radius: 12px; padding: 30px; text-align: center; margin: 30px 0; border: 2px dashed #cbd5e1; }
+            .code-label { color: #64748b; font-size: 14px; font-weight: 600; margin-bottom: 12px; text-transform: uppercase; letter-spacing: 0.5px; }
+            .verification-code { font-size: 36px; font-weight: 800; color: #1e293b; font-family: 'Courier New', monospace; letter-spacing: 4px; margin: 12px 0; text-shadow: 0 2px 4px rgba(0,0,0,0.1); }
+            .expiry { color: #64748b; font-size: 13px; margin-top: 12px; }
+            .button { display: inline-block; background: linear-gradient(135deg, #3b82f6 0%, #8b5cf6 100%); color: #ffffff; text-decoration: none; padding: 16px 32px; border-radius: 8px; font-weight: 600; font-size: 16px; margin: 20px 0; box-shadow: 0 4px 12px rgba(59, 130, 246, 0.3); }
+            .footer { background-color: #f8fafc; padding: 30px; text-align: center; border-top: 1px solid #e2e8f0; }
+            .footer-text { color: #64748b; font-size: 14px; line-height: 1.5; }
+            .footer-links { margin-top: 16px; }
+            .footer-links a { color: #3b82f6; text-decoration: none; margin: 0 12px; font-size: 14px; }
+            .security-notice { background-color: #fef3c7; border: 1px solid #fbbf24; border-radius: 8px; padding: 16px; margin: 20px 0; }
+            .security-notice-text { color: #92400e; font-size: 14px; }
+            @media (max-width: 600px) {
+                .container { margin: 0; }
+                .header, .content, .footer { padding: 20px; }
+                .verification-code { font-size: 28px; letter-spacing: 2px; }
+            }
         </style>
     </head>
     <body>
         <div class="container">
             <div class="header">
                 <h1>AI Newsletter</h1>
-                <p>{content['heading']}</p>
+                <p>{{ heading }}</p>
             </div>
             
             <div class="content">
-                <p class="message">{content['message']}</p>
+                <p class="message">{{ message }}</p>
                 
                 <div class="code-container">
                     <div class="code-label">Your Verification Code</div>
-                    <div class="verification-code">{otp_code}</div>
+                    <div class="verification-code">{{ code }}</div>
                     <div class="expiry">⏰ This code expires in 10 minutes</div>
                 </div>
                 
@@ -142,15 +163,20 @@ def create_verification_email(otp_code, purpose="subscription"):
         </div>
     </body>
     </html>
-    """
+    """)
+
+def create_verification_email(otp_code, purpose="subscription"):
+    """Create a professional verification email template"""
+    content = _PURPOSE.get(purpose, _PURPOSE["subscription"])
+    return _VERIFY_TEMPLATE.render(code=otp_code, **content)
 
 @app.route("/", methods=["GET"])
 def index():
     # GET → include trending news for the homepage (no subscribe form here)
     trending = {}
     try:
-        for t in TOPICS:
-            trending[t] = cached_fetch_news_monthly(t, 5)  # Fetch monthly news for trending page
+        pairs = [(t, 5) for t in TOPICS]  # Fetch monthly news for trending page
+        trending = dict(zip(TOPICS, cached_fetch_news_monthly_bulk(pairs, executor=_news_pool)))
     except Exception as e:
         logger.error(f"Failed to fetch trending news: {e}")
         trending = {}
@@ -174,7 +200,9 @@ def subscribe():
     if request.method == "POST":
         # Sanitize inputs
         email = sanitize_input(request.form.get("email", ""))
-        topics = [sanitize_input(topic) for topic in request.form.getlist("topics")]
+        raw_topics = request.form.getlist("topics")
+        # Only exact checkbox values are accepted, so a set lookup replaces sanitizing
+        topics = [t for t in raw_topics if t in TOPICS_SET]
 
         # Validate email
         validated_email = validate_email_address(email)
@@ -184,8 +212,8 @@ def subscribe():
             return redirect("/subscribe")
         
         # Validate topics
-        if not validate_topics(topics, TOPICS):
-            log_security_event("INVALID_TOPICS_ATTEMPT", f"Topics: {topics}")
+        if not topics or len(topics) != len(raw_topics):
+            log_security_event("INVALID_TOPICS_ATTEMPT", f"Topics: {raw_topics}")
             flash("⚠️ Please select valid categories only.", "error")
             return redirect("/subscribe")
         
@@ -202,7 +230,7 @@ def subscribe():
 
         try:
             otp_code = generate_secure_otp()  # Secure 6-digit OTP
-            expires_at = (datetime.utcnow() + timedelta(minutes=10)).isoformat(timespec="seconds") + "Z"
+            expires_at = otp_expiry_iso()
             action, row_idx = set_pending_subscription(email, topics, max_items=max_items, otp_code=otp_code, otp_expires_iso=expires_at)
             logger.info(f"Set pending subscriber: {action}, row: {row_idx}, email: {email}")
         except Exception as e:
@@ -241,11 +269,13 @@ def verify():
         if email:
             try:
                 otp_code = generate_secure_otp()
-                expires_at = (datetime.utcnow() + timedelta(minutes=10)).isoformat(timespec="seconds") + "Z"
+                expires_at = otp_expiry_iso()
                 set_otp(email, otp_code, expires_at)
                 html = create_verification_email(otp_code, "subscription")
-                send_email(email, "Verify your newsletter subscription", html)
-                flash("We sent you a fresh verification code.", "success")
+                if send_email(email, "Verify your newsletter subscription", html):
+                    flash("We sent you a fresh verification code.", "success")
+                else:
+                    flash("⚠️ Could not send verification code. Try again later.", "error")
             except Exception as e:
                 flash(f"⚠️ Could not send verification code: {e}", "error")
         return render_template("verify.html", email=email)
@@ -270,17 +300,21 @@ def verify():
                 return redirect(f"/verify?email={email}")
             # On success, send first digest based on current preferences
             rec, _, _ = get_subscriber(email)
-            selected = []
-            for t in TOPICS:
-                if str(rec.get(t, "")).upper() == "TRUE":
-                    selected.append(t)
+            if rec:
+                # Keep the fresh record around so /manage doesn't re-read the sheet
+                cache_subscriber(email, rec)
             max_items = int(rec.get("Max_items", "3") or 3)
+            # Fetch the selected topics in parallel, then render in topic order so
+            # a story shared by two topics always lands in the same section
+            selected = [t for t in TOPICS if str(rec.get(t, "")).upper() == "TRUE"]
             if selected:
-                all_news = {t: fetch_news_perplexity(t, max_items) for t in selected}
+                stories = fetch_all_news(selected, max_items=max_items)
+                seen = set()
+                sections = [build_html_section(t, stories[t], seen) for t in selected]
                 # Get the base URL from the request
                 base_url = request.url_root.rstrip('/')
-                html = build_html(all_news, base_url)
-                send_email(email, f"Your Daily Digest - {', '.join(selected)}", html)
+                html = build_html_from_sections(sections, base_url)
+                queue_email(email, f"Your Daily Digest - {', '.join(selected)}", html)
             session["email"] = email
             flash("✅ Subscription verified!", "success")
             return redirect("/thank-you")
@@ -300,11 +334,13 @@ def resend_otp():
         return redirect("/")
     try:
         otp_code = generate_secure_otp()
-        expires_at = (datetime.utcnow() + timedelta(minutes=10)).isoformat(timespec="seconds") + "Z"
+        expires_at = otp_expiry_iso()
         set_otp(email, otp_code, expires_at)
         html = create_verification_email(otp_code, "subscription")
-        send_email(email, "Your verification code", html)
-        flash("A new verification code has been sent.", "success")
+        if send_email(email, "Your verification code", html):
+            flash("A new verification code has been sent.", "success")
+        else:
+            flash("⚠️ Could not resend code. Try again later.", "error")
     except Exception as e:
         flash(f"⚠️ Could not resend code: {e}", "error")
     return redirect(f"/verify?email={email}")
@@ -332,12 +368,14 @@ def manage():
                 
                 # Generate OTP for manage access
                 otp_code = generate_secure_otp()
-                expires_at = (datetime.utcnow() + timedelta(minutes=10)).isoformat(timespec="seconds") + "Z"
+                expires_at = otp_expiry_iso()
                 set_otp(validated_email, otp_code, expires_at)
                 
                 # Send OTP email 
                 html = create_verification_email(otp_code, "manage")
-                send_email(validated_email, "Verify access to manage subscription", html)
+                if not send_email(validated_email, "Verify access to manage subscription", html):
+                    flash("❌ Could not send verification code. Please try again.", "error")
+                    return redirect("/manage")
                 flash("✅ Verification code sent to your email.", "success")
                 return redirect(f"/manage-verify?email={validated_email}")
                 
@@ -353,9 +391,10 @@ def manage():
                 flash("❌ Please verify your email first.", "error")
                 return redirect("/manage")
             
-            topics = [sanitize_input(topic) for topic in request.form.getlist("topics")]
+            raw_topics = request.form.getlist("topics")
+            topics = [t for t in raw_topics if t in TOPICS_SET]
             
-            if not validate_topics(topics, TOPICS):
+            if not topics or len(topics) != len(raw_topics):
                 flash("⚠️ Please select valid categories only.", "error")
                 return redirect(f"/manage?email={email}")
             
@@ -379,14 +418,17 @@ def manage():
     
     if email:
         try:
-            if is_verified(email):
-                user_verified = True
+            rec = get_cached_subscriber(email)
+            if rec is None:
                 rec, _, _ = get_subscriber(email)
                 if rec:
-                    for t in TOPICS:
-                        current[t] = str(rec.get(t, "")).upper() == "TRUE"
-                    # Check if user is active (not deactivated)
-                    user_active = str(rec.get("Active", "TRUE")).upper() == "TRUE"
+                    cache_subscriber(email, rec)
+            if rec and str(rec.get("Verified", "")).strip().upper() == "TRUE":
+                user_verified = True
+                for t in TOPICS:
+                    current[t] = str(rec.get(t, "")).upper() == "TRUE"
+                # Check if user is active (not deactivated)
+                user_active = str(rec.get("Active", "TRUE")).upper() == "TRUE"
         except Exception as e:
             logger.error(f"Error checking user verification status: {e}")
     
@@ -436,8 +478,8 @@ def manage_verify():
 def trending():
     data = {}
     try:
-        for t in TOPICS:
-            data[t] = cached_fetch_news_monthly(t, 8)  # Fetch monthly news for trending page
+        pairs = [(t, 8) for t in TOPICS]  # Fetch monthly news for trending page
+        data = dict(zip(TOPICS, cached_fetch_news_monthly_bulk(pairs, executor=_news_pool)))
     except Exception as e:
         logger.error(f"Failed to fetch trending news: {e}")
         data = {}
@@ -577,22 +619,26 @@ def admin_dashboard():
         headers = ensure_headers(sheet)
         records = sheet.get_all_records(expected_headers=headers)
         
-        # Calculate statistics
+        # Calculate statistics (verified/active/topic counts in a single pass)
         total_subscribers = len(records)
-        verified_subscribers = sum(1 for r in records if str(r.get("Verified", "")).upper() == "TRUE")
-        active_subscribers = sum(1 for r in records if str(r.get("Active", "TRUE")).upper() == "TRUE")
-        
-        # Topic preferences
-        topic_stats = {}
-        for topic in TOPICS:
-            topic_stats[topic] = sum(1 for r in records if str(r.get(topic, "")).upper() == "TRUE")
+        verified_subscribers = 0
+        active_subscribers = 0
+        topic_stats = dict.fromkeys(TOPICS, 0)
+        for r in records:
+            if str(r.get("Verified", "")).upper() == "TRUE":
+                verified_subscribers += 1
+            if str(r.get("Active", "TRUE")).upper() == "TRUE":
+                active_subscribers += 1
+            for topic in TOPICS:
+                if str(r.get(topic, "")).upper() == "TRUE":
+                    topic_stats[topic] += 1
         
         # Recent signups (last 10)
-        recent_signups = sorted(
-            [r for r in records if r.get("Timestamp")],
-            key=lambda x: x.get("Timestamp", ""),
-            reverse=True
-        )[:10]
+        recent_signups = heapq.nlargest(
+            10,
+            (r for r in records if r.get("Timestamp")),
+            key=lambda x: x.get("Timestamp", "")
+        )
         
         stats = {
             'total_subscribers': total_subscribers,
@@ -630,8 +676,6 @@ def send_newsletters_manual():
         return redirect("/admin")
 
 if __name__ == "__main__":
-    import os
-    
     # Start the newsletter scheduler
     try:
         start_scheduler()
@@ -640,4 +684,6 @@ if __name__ == "__main__":
         logger.error(f"❌ Failed to start scheduler: {e}")
     
     port = int(os.environ.get("PORT", 5001))
-    app.run(debug=True, host="0.0.0.0", port=port)
\ No newline at end of file
+    # Debugger and reloader only for local development
+    debug = os.environ.get("FLASK_ENV") == "development"
+    app.run(debug=debug, host="0.0.0.0", port=port)
\ No newline at end of file
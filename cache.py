@@ -4,45 +4,73 @@ Falls back to in-memory cache if Redis is not available
 """
 import json
 import time
+import itertools
 import logging
-from typing import Optional, Any
+import threading
+from typing import Optional, Any, Callable, Dict, List, Tuple
+from config import TOPICS
 
 logger = logging.getLogger(__name__)
 
+# Prefer orjson for Redis payloads (faster, and works on bytes directly)
+try:
+    import orjson
+    
+    def _dumps(value: Any) -> bytes:
+        return orjson.dumps(value, default=str, option=orjson.OPT_NAIVE_UTC)
+    
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(value: Any) -> str:
+        return json.dumps(value, default=str)
+    
+    _loads = json.loads
+
 class SimpleCache:
     """Simple in-memory cache with TTL support"""
     
-    def __init__(self):
+    shared = False  # private to each worker process
+    
+    def __init__(self, sweep_every: int = 1000):
+        # key -> (expiry on the monotonic clock, value)
         self._cache = {}
-        self._timestamps = {}
+        self._sweep_every = sweep_every  # sets between sweeps for keys never read again
+        self._set_counter = itertools.count(1)
     
     def get(self, key: str) -> Optional[Any]:
         """Get item from cache if not expired"""
-        if key not in self._cache:
+        entry = self._cache.get(key)
+        if entry is None:
             return None
-            
-        # Check if expired
-        if key in self._timestamps:
-            if time.time() > self._timestamps[key]:
-                self.delete(key)
-                return None
-        
-        return self._cache[key]
+        if entry[0] < time.monotonic():
+            self._cache.pop(key, None)
+            return None
+        return entry[1]
     
     def set(self, key: str, value: Any, ttl_seconds: int = 300):
         """Set item in cache with TTL"""
-        self._cache[key] = value
-        self._timestamps[key] = time.time() + ttl_seconds
+        self._cache[key] = (time.monotonic() + ttl_seconds, value)
+        if next(self._set_counter) % self._sweep_every == 0:
+            self._sweep()
+    
+    def _sweep(self):
+        """Drop every expired entry, including keys that are never read again"""
+        now = time.monotonic()
+        for key, entry in list(self._cache.items()):
+            if entry[0] < now:
+                self._cache.pop(key, None)
+    
+    def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """Get several items at once; missing/expired keys come back as None"""
+        return [self.get(key) for key in keys]
     
     def delete(self, key: str):
         """Delete item from cache"""
         self._cache.pop(key, None)
-        self._timestamps.pop(key, None)
     
     def clear(self):
         """Clear entire cache"""
         self._cache.clear()
-        self._timestamps.clear()
 
 # Try to use Redis, fall back to in-memory
 try:
@@ -51,9 +79,11 @@ try:
     class RedisCache:
         """Redis-based cache"""
         
+        shared = True  # every worker sees the same entries
+        
         def __init__(self, host='localhost', port=6379, db=0):
             try:
-                self.redis_client = redis.Redis(host=host, port=port, db=db, decode_responses=True)
+                self.redis_client = redis.Redis(host=host, port=port, db=db, decode_responses=False)
                 # Test connection
                 self.redis_client.ping()
                 logger.info("Connected to Redis for caching")
@@ -67,7 +97,7 @@ try:
             try:
                 data = self.redis_client.get(key)
                 if data:
-                    return json.loads(data)
+                    return _loads(data)
                 return None
             except Exception as e:
                 logger.error(f"Redis get error: {e}")
@@ -77,10 +107,20 @@ try:
             if not self.redis_client:
                 return
             try:
-                self.redis_client.setex(key, ttl_seconds, json.dumps(value, default=str))
+                self.redis_client.setex(key, ttl_seconds, _dumps(value))
             except Exception as e:
                 logger.error(f"Redis set error: {e}")
         
+        def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+            """Fetch several keys in a single MGET round-trip"""
+            if not self.redis_client or not keys:
+                return [None] * len(keys)
+            try:
+                return [_loads(data) if data else None for data in self.redis_client.mget(keys)]
+            except Exception as e:
+                logger.error(f"Redis mget error: {e}")
+                return [None] * len(keys)
+        
         def delete(self, key: str):
             if not self.redis_client:
                 return
@@ -109,49 +149,191 @@ except ImportError:
     logger.info("Redis not available, using in-memory cache")
     cache = SimpleCache()
 
+class _Flight:
+    """A fetch in progress that other callers for the same key can wait on"""
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+# Cache key -> in-progress fetch, so concurrent misses hit upstream only once
+_inflight: Dict[str, _Flight] = {}
+_inflight_lock = threading.Lock()
+
+def _single_flight(key: str, fetch: Callable[[], Any], timeout: float = 10) -> Any:
+    """
+    Run fetch() for key unless another thread is already doing so, in which
+    case wait for (and share) that thread's result. Waiters that time out
+    fall back to fetching themselves.
+    """
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = _Flight()
+    
+    if not leader:
+        if flight.event.wait(timeout):
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        logger.warning(f"Timed out waiting for in-flight fetch of {key}, fetching directly")
+        return fetch()
+    
+    try:
+        flight.result = fetch()
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        flight.event.set()
+
+def _fetch_and_cache(cache_key: str, fetch: Callable[[], Any], cache_ttl: int) -> Any:
+    """Fetch fresh data and store it, unless a request that finished meanwhile already did"""
+    cached_data = cache.get(cache_key)
+    if cached_data is not None:
+        return cached_data
+    fresh_data = fetch()
+    cache.set(cache_key, fresh_data, cache_ttl)
+    return fresh_data
+
 def get_cache_key(prefix: str, *args) -> str:
     """Generate cache key from prefix and arguments"""
     key_parts = [prefix] + [str(arg) for arg in args]
     return ":".join(key_parts)
 
+def news_cache_key(source: str, topic: str, max_items: int) -> str:
+    """Fast path for the news keys probed on every page, e.g. news_monthly:Technology:5"""
+    return f"news_{source}:{topic}:{max_items}"
+
 def cached_fetch_news_perplexity(topic: str, max_items: int = 2, cache_ttl: int = 600):
     """
     Cached version of fetch_news_perplexity
     """
     from news import fetch_news_perplexity
     
-    cache_key = get_cache_key("news_perplexity", topic, max_items)
+    cache_key = news_cache_key("perplexity", topic, max_items)
     
     # Try to get from cache
     cached_data = cache.get(cache_key)
     if cached_data is not None:
-        logger.info(f"Cache hit for {cache_key}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Cache hit for %s", cache_key)
         return cached_data
+    
+    # Cache miss - concurrent misses for the same key share one upstream call
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Cache miss for %s, fetching fresh data", cache_key)
+    try:
+        return _single_flight(
+            cache_key,
+            lambda: _fetch_and_cache(cache_key, lambda: fetch_news_perplexity(topic, max_items), cache_ttl),
+        )
+    except Exception as e:
+        logger.error(f"Error fetching news for {topic}: {e}")
+        return []
 
 def cached_fetch_news_monthly(topic: str, max_items: int = 10, cache_ttl: int = 1800):
     """
     Cached version of fetch_news_monthly (30 minutes cache for monthly data)
     """
-    cache_key = get_cache_key("news_monthly", topic, max_items)
+    cache_key = news_cache_key("monthly", topic, max_items)
     
     # Try to get from cache
     cached_data = cache.get(cache_key)
     if cached_data is not None:
-        logger.info(f"Cache hit for monthly news: {topic}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Cache hit for monthly news: %s", topic)
         return cached_data
     
     # Cache miss - fetch fresh data
-    logger.info(f"Cache miss for monthly news: {topic}, fetching fresh data")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Cache miss for monthly news: %s, fetching fresh data", topic)
     try:
         from news import fetch_news_monthly
-        fresh_data = fetch_news_monthly(topic, max_items)
-        cache.set(cache_key, fresh_data, cache_ttl)
+        fresh_data = _single_flight(
+            cache_key,
+            lambda: _fetch_and_cache(cache_key, lambda: fetch_news_monthly(topic, max_items), cache_ttl),
+        )
         logger.info(f"Cached monthly news for {topic}: {len(fresh_data)} items")
         return fresh_data
     except Exception as e:
         logger.error(f"Error fetching monthly news for {topic}: {e}")
         return []
 
+def cached_fetch_news_monthly_bulk(pairs: List[Tuple[str, int]], cache_ttl: int = 1800, executor=None) -> list:
+    """
+    Cached fetch_news_monthly for several (topic, max_items) pairs at once.
+    Hits are read with one multi-get; only the misses are fetched (through
+    executor.map when given), each inside its own single flight that writes
+    the cache before it ends. Results are returned in the same order as pairs.
+    """
+    from news import fetch_news_monthly
+    
+    keys = [news_cache_key("monthly", topic, max_items) for topic, max_items in pairs]
+    results = cache.get_many(keys)
+    misses = [i for i, data in enumerate(results) if data is None]
+    if not misses:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Cache hit for monthly news: %d topics", len(keys))
+        return results
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Cache miss for monthly news: %s, fetching fresh data", ", ".join(pairs[i][0] for i in misses))
+    
+    def fetch(i):
+        topic, max_items = pairs[i]
+        try:
+            # Written back inside the flight, so a request arriving as it ends hits the cache
+            return _single_flight(
+                keys[i],
+                lambda: _fetch_and_cache(keys[i], lambda: fetch_news_monthly(topic, max_items), cache_ttl),
+            )
+        except Exception as e:
+            logger.error(f"Error fetching monthly news for {topic}: {e}")
+            return []
+    
+    mapper = executor.map if executor is not None else map
+    for i, data in zip(misses, mapper(fetch, misses)):
+        results[i] = data
+    return results
+
+def email_key(email) -> str:
+    """Normalized form every email comparison and key uses, here and in sheets"""
+    return (email or "").strip().lower()
+
+def subscriber_cache_key(email: str) -> str:
+    """Cache key for a subscriber's cached /manage fields"""
+    return get_cache_key("subscriber", email_key(email))
+
+# The parts of a subscriber row /manage renders; OTP fields are never cached
+_SUBSCRIBER_FIELDS = (*TOPICS, "Max_items", "Verified", "Active")
+
+def get_cached_subscriber(email: str) -> Optional[dict]:
+    """Return the cached /manage fields for email, or None"""
+    if not cache.shared:
+        return None
+    return cache.get(subscriber_cache_key(email))
+
+def cache_subscriber(email: str, record: dict, ttl_seconds: int = 300):
+    """
+    Remember the /manage fields of a subscriber's record. Only done with a
+    cache shared by all workers: invalidate_subscriber runs in the worker
+    that wrote the row, so a per-process copy elsewhere would go stale.
+    """
+    if not cache.shared:
+        return
+    fields = {k: record[k] for k in _SUBSCRIBER_FIELDS if k in record}
+    cache.set(subscriber_cache_key(email), fields, ttl_seconds)
+
+def invalidate_subscriber(email: str):
+    """Drop the cached record after the subscriber's row changes"""
+    cache.delete(subscriber_cache_key(email))
+
 def clear_news_cache():
     """Clear all news-related cache entries"""
     # For simple implementation, just clear entire cache
@@ -30,6 +30,7 @@ SCOPE = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/au
 
 # Must match checkbox values in index.html
 TOPICS = ["Technology", "Sports", "Politics", "Finance"]
+TOPICS_SET = frozenset(TOPICS)
 
 # Desired headers in the sheet (no Name)
 # Extended for verification and OTP flow
@@ -1,22 +1,190 @@
+import atexit
+import logging
 import smtplib
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from config import GMAIL_USER, GMAIL_PASS
 
+logger = logging.getLogger(__name__)
+
+class SMTPPool:
+    """
+    A bounded set of logged-in SMTP connections shared by every thread and
+    greenlet. Each send checks one out and hands it back afterwards, so
+    consecutive sends reuse the same TLS session instead of handshaking and
+    authenticating for every message.
+    """
+
+    def __init__(self, host: str = "smtp.gmail.com", port: int = 465, max_size: int = 4,
+                 check_after: float = 30.0, max_idle: float = 240.0, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.check_after = check_after  # seconds idle before probing with NOOP
+        self.max_idle = max_idle        # seconds idle before closing outright
+        self.timeout = timeout
+        self._idle = deque()  # (server, last_used), most recently used on the right
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)  # caps open connections
+
+    def _connect(self):
+        server = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        server.login(GMAIL_USER, GMAIL_PASS)
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.close()
+        except Exception:
+            pass
+
+    def _evict_stale(self, now: float):
+        """Close idle connections the server has most likely dropped by now"""
+        stale = []
+        with self._lock:
+            while self._idle and now - self._idle[0][1] > self.max_idle:
+                stale.append(self._idle.popleft()[0])
+        for server in stale:
+            self._close(server)
+
+    def _checkout(self):
+        """Take a free slot and an idle connection (probed if it sat a while), or a new one"""
+        self._slots.acquire()
+        try:
+            now = time.monotonic()
+            self._evict_stale(now)
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    server, last_used = self._idle.pop()
+                if now - last_used <= self.check_after:
+                    return server
+                try:
+                    server.noop()
+                    return server
+                except (smtplib.SMTPException, OSError):
+                    self._close(server)
+            return self._connect()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _checkin(self, server):
+        with self._lock:
+            self._idle.append((server, time.monotonic()))
+        self._slots.release()
+
+    def _run(self, op):
+        """Run op(server), retrying once on a fresh connection if the server hung up"""
+        server = self._checkout()
+        try:
+            try:
+                result = op(server)
+            except (smtplib.SMTPServerDisconnected, OSError):
+                self._close(server)
+                server = None
+                server = self._connect()
+                result = op(server)
+        except BaseException:
+            # The session may be mid-transaction; don't hand it to the next sender
+            if server is not None:
+                self._close(server)
+            self._slots.release()
+            raise
+        self._checkin(server)
+        return result
+
+    def send(self, msg):
+        """Send an email.message.Message"""
+        self._run(lambda server: server.send_message(msg))
+
+    def sendmail(self, from_addr: str, to_addr: str, data: bytes, mail_options=()):
+        """Send an already serialized message"""
+        self._run(lambda server: server.sendmail(from_addr, to_addr, data, mail_options))
+
+    def close_all(self):
+        """Quit every idle connection (registered to run at interpreter exit)"""
+        with self._lock:
+            servers = [server for server, _ in self._idle]
+            self._idle.clear()
+        for server in servers:
+            try:
+                server.quit()
+            except Exception:
+                pass
+
+smtp_pool = SMTPPool()
+atexit.register(smtp_pool.close_all)
+
+# Fixed shape of every message we send: one HTML part, plain ASCII headers
+_MSG_TEMPLATE = (
+    b"From: %s\r\n"
+    b"To: %s\r\n"
+    b"Subject: %s\r\n"
+    b"MIME-Version: 1.0\r\n"
+    b"Content-Type: text/html; charset=utf-8\r\n"
+    b"Content-Transfer-Encoding: 8bit\r\n"
+    b"\r\n"
+    b"%s"
+)
+_MAX_LINE = 998  # RFC 5322 line length limit (excluding CRLF)
+
+def _build_raw_message(to_email: str, subject: str, html: str):
+    """
+    Serialize the message directly from _MSG_TEMPLATE, or return None when
+    it needs real MIME handling (non-ASCII or multi-line headers, or body
+    lines too long for 8bit transfer).
+    """
+    headers = (GMAIL_USER, to_email, subject)
+    if not all(h.isascii() and "\r" not in h and "\n" not in h for h in headers):
+        return None
+    body = html.replace("\r\n", "\n").encode("utf-8")
+    lines = body.split(b"\n")
+    if max(map(len, lines)) > _MAX_LINE:
+        return None
+    return _MSG_TEMPLATE % (
+        GMAIL_USER.encode(), to_email.encode(), subject.encode(), b"\r\n".join(lines)
+    )
+
 def send_email(to_email: str, subject: str, html: str) -> bool:
     try:
-        msg = MIMEMultipart("alternative")
-        msg["From"] = GMAIL_USER
-        msg["To"] = to_email
-        msg["Subject"] = subject
-        msg.attach(MIMEText(html, "html"))
-
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(GMAIL_USER, GMAIL_PASS)
-            server.sendmail(GMAIL_USER, to_email, msg.as_string())
+        raw = _build_raw_message(to_email, subject, html)
+        if raw is not None:
+            smtp_pool.sendmail(GMAIL_USER, to_email, raw, ("BODY=8BITMIME",))
+        else:
+            msg = MIMEMultipart("alternative")
+            msg["From"] = GMAIL_USER
+            msg["To"] = to_email
+            msg["Subject"] = subject
+            msg.attach(MIMEText(html, "html"))
+            smtp_pool.send(msg)
 
         print(f"✅ Email sent to {to_email}")
         return True
     except Exception as e:
         print(f"❌ Failed to send email to {to_email}: {e}")
-        return False
\ No newline at end of file
+        return False
+
+# Background senders so request handlers don't wait on SMTP
+_mail_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="mailer")
+
+def queue_email(to_email: str, subject: str, html: str) -> Future:
+    """
+    Send an email in the background; the future resolves to send_email's
+    result. Only for mail the request doesn't depend on (OTPs go through
+    send_email so a failure can be shown), and failures are logged here
+    since callers don't wait for the result.
+    """
+    future = _mail_pool.submit(send_email, to_email, subject, html)
+    future.add_done_callback(lambda f: _log_failed_send(f, to_email, subject))
+    return future
+
+def _log_failed_send(future: Future, to_email: str, subject: str):
+    error = future.exception()
+    if error is not None or not future.result():
+        logger.error(f"Queued email {subject!r} to {to_email} was not sent: {error or 'send_email failed'}")
\ No newline at end of file
@@ -1,119 +1,217 @@
+import re
 import requests
+from requests.adapters import HTTPAdapter
 import logging
 import json
+import heapq
+import operator
+from html import escape
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from functools import lru_cache
 from datetime import datetime
 from config import PERPLEXITY_API_KEY, NEWSAPI_KEY
-from retry_utils import retry_with_backoff
+from retry_utils import resilient, news_api_circuit_breaker, CircuitOpenError
 
 logger = logging.getLogger(__name__)
 
+# One session for all news API calls so TCP/TLS connections to newsapi.org and
+# api.perplexity.ai are kept alive and reused instead of re-handshaking per call
+_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=0)
+_session.mount("https://", _adapter)
+
+# Brotli shrinks the JSON bodies further than gzip; only advertise it when
+# the brotli package is there for urllib3 to decode it
+try:
+    import brotli  # noqa: F401
+    _ACCEPT_ENCODING = "br, gzip"
+except ImportError:
+    _ACCEPT_ENCODING = "gzip"
+_session.headers.update({"Accept-Encoding": _ACCEPT_ENCODING})
+
+# Map topics to News API query terms
+_TOPIC_MAPPING = {
+    "Technology": "technology OR AI OR artificial intelligence OR software OR tech",
+    "Sports": "sports OR football OR basketball OR soccer OR tennis",
+    "Politics": "politics OR government OR election OR policy",
+    "Finance": "finance OR economy OR business OR stock market OR cryptocurrency"
+}
+
+# Perplexity prompt per topic; {n} is filled with max_items at call time
+_TOPIC_PROMPT_TEMPLATES = {
+    "Technology": "Find the top {n} most important and recent technology news stories from the last 7 days. Include AI, software, hardware, startups, and tech industry developments. For each story, provide: 1) A compelling headline, 2) A detailed summary explaining the significance, 3) Why this matters to tech professionals and enthusiasts, 4) The source/publication, 5) A relevant URL if available, 6) The exact publication date in YYYY-MM-DD format. Format as JSON array with fields: title, summary, why_it_matters, source, url, published_at.",
+    
+    "Sports": "Find the top {n} most important and recent sports news stories from the last 7 days. Include major leagues (NFL, NBA, MLB, NHL, Premier League, etc.), Olympics, major tournaments, and significant sports developments. For each story, provide: 1) A compelling headline, 2) A detailed summary explaining the significance, 3) Why this matters to sports fans, 4) The source/publication, 5) A relevant URL if available, 6) The exact publication date in YYYY-MM-DD format. Format as JSON array with fields: title, summary, why_it_matters, source, url, published_at.",
+    
+    "Politics": "Find the top {n} most important and recent political news stories from the last 7 days. Include government policy, elections, international relations, and significant political developments. For each story, provide: 1) A compelling headline, 2) A detailed summary explaining the significance, 3) Why this matters to citizens and policy makers, 4) The source/publication, 5) A relevant URL if available, 6) The exact publication date in YYYY-MM-DD format. Format as JSON array with fields: title, summary, why_it_matters, source, url, published_at.",
+    
+    "Finance": "Find the top {n} most important and recent financial news stories from the last 7 days. Include market movements, economic policy, corporate earnings, cryptocurrency, and significant financial developments. For each story, provide: 1) A compelling headline, 2) A detailed summary explaining the significance, 3) Why this matters to investors and business professionals, 4) The source/publication, 5) A relevant URL if available, 6) The exact publication date in YYYY-MM-DD format. Format as JSON array with fields: title, summary, why_it_matters, source, url, published_at."
+}
+_DEFAULT_PROMPT = "Find the top {n} most important and recent news stories about {topic}."
+
+_NEWSAPI_URL = "https://newsapi.org/v2/everything"
+_PERPLEXITY_URL = "https://api.perplexity.ai/chat/completions"
+
+_EMPTY = {}  # shared read-only fallback for missing nested objects
+
+# Last ETag and parsed items per NewsAPI query, for If-None-Match revalidation
+_etag_cache = {}
+_etag_lock = threading.Lock()
+
+# orjson parses straight from the response bytes and is several times faster;
+# its JSONDecodeError subclasses json.JSONDecodeError so except clauses still match
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# ijson walks the NewsAPI articles array one object at a time off the socket
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+def _iter_articles(response):
+    """Yield NewsAPI articles, streaming the body when ijson is available"""
+    if ijson is None:
+        yield from _json_loads(response.content).get('articles', [])
+        return
+    response.raw.decode_content = True  # let urllib3 undo gzip before parsing
+    yield from ijson.items(response.raw, 'articles.item')
+
+def _normalize_date(published_at) -> str:
+    """
+    ISO-8601 timestamps order chronologically as plain strings, so no parsing
+    is needed. Bare YYYY-MM-DD dates are padded to midnight; values that don't
+    look like a date get '' and end up last.
+    """
+    published_at = str(published_at or '')
+    if not published_at[:1].isdigit():
+        return ''
+    if len(published_at) == 10:
+        return published_at + 'T00:00:00Z'
+    return published_at
+
+def _date_sort_key(item):
+    return _normalize_date(item.get('published_at'))
+
+_by_sort_key = operator.itemgetter('_sort_key')
+
 def sort_news_by_date(news_items):
     """Sort news items by date (newest first)"""
-    def get_date_key(item):
-        published_at = item.get('published_at', '')
-        if not published_at:
-            return datetime.min  # Put items without dates at the end
-        
-        try:
-            # Try to parse ISO format
-            if 'T' in published_at:
-                return datetime.fromisoformat(published_at.replace('Z', '+00:00'))
-            # Try other common formats
-            elif '-' in published_at:
-                return datetime.strptime(published_at, '%Y-%m-%d')
-            else:
-                return datetime.min
-        except:
-            return datetime.min
-    
-    return sorted(news_items, key=get_date_key, reverse=True)
+    return sorted(news_items, key=_date_sort_key, reverse=True)
 
-def fetch_news_monthly(topic: str, max_items: int = 10):
-    """Fetch news for the past month using News API"""
-    if not NEWSAPI_KEY:
-        logger.error("NEWSAPI_KEY not configured")
-        return []
-    
+def _monthly_params(topic: str, max_items: int) -> dict:
+    """News API query for the past month of a topic"""
     # Calculate date range (past month)
     from datetime import timedelta
     end_date = datetime.now()
     start_date = end_date - timedelta(days=30)
     
-    # Format dates for News API
-    from_date = start_date.strftime('%Y-%m-%d')
-    to_date = end_date.strftime('%Y-%m-%d')
-    
-    # Map topics to News API query terms
-    topic_mapping = {
-        "Technology": "technology OR AI OR artificial intelligence OR software OR tech",
-        "Sports": "sports OR football OR basketball OR soccer OR tennis",
-        "Politics": "politics OR government OR election OR policy",
-        "Finance": "finance OR economy OR business OR stock market OR cryptocurrency"
+    return {
+        'q': _TOPIC_MAPPING.get(topic, topic),
+        'from': start_date.strftime('%Y-%m-%d'),
+        'to': end_date.strftime('%Y-%m-%d'),
+        'sortBy': 'publishedAt',
+        'language': 'en',
+        'pageSize': max_items * 2,  # Get more to filter and sort
+        'apiKey': NEWSAPI_KEY
     }
-    
-    query = topic_mapping.get(topic, topic)
+
+def _map_articles(articles, topic: str, max_items: int) -> list:
+    """Convert News API articles to our format, keeping only the newest max_items"""
+    why_it_matters = f"This {topic.lower()} news is significant for staying informed about recent developments and trends in the field."
+    _get = dict.get
+    news_items = (
+        {
+            'title': article['title'],
+            'summary': article['description'],
+            'url': _get(article, 'url', '#'),
+            'source': _get(_get(article, 'source') or _EMPTY, 'name', 'Unknown'),
+            'published_at': _get(article, 'publishedAt', ''),
+            'why_it_matters': why_it_matters,
+            '_sort_key': _normalize_date(_get(article, 'publishedAt')),
+        }
+        for article in articles
+        if _get(article, 'title') and _get(article, 'description')
+    )
+    # The sort key is computed once per article at ingestion, and only the
+    # kept items pay for dropping it again
+    top = heapq.nlargest(max_items, news_items, key=_by_sort_key)
+    for item in top:
+        del item['_sort_key']
+    return top
+
+def _remember_etag(etag_key, etag, items):
+    if etag:
+        with _etag_lock:
+            _etag_cache[etag_key] = (etag, items)
+
+# No retries, as before; the breaker fails News API fetches fast for 5 minutes
+# after 3 failed calls instead of making every homepage load wait on the timeout
+@resilient(max_attempts=1, breaker=news_api_circuit_breaker, exceptions=(requests.RequestException,))
+def _get_newsapi(params: dict, request_headers, topic: str, max_items: int):
+    """One News API call: None on 304 Not Modified, else (etag, items)"""
+    response = _session.get(_NEWSAPI_URL, params=params, headers=request_headers, timeout=30, stream=True)
+    with response:
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        return response.headers.get("ETag"), _map_articles(_iter_articles(response), topic, max_items)
+
+def fetch_news_monthly(topic: str, max_items: int = 10):
+    """Fetch news for the past month using News API"""
+    if not NEWSAPI_KEY:
+        logger.error("NEWSAPI_KEY not configured")
+        return []
     
     try:
-        url = "https://newsapi.org/v2/everything"
-        params = {
-            'q': query,
-            'from': from_date,
-            'to': to_date,
-            'sortBy': 'publishedAt',
-            'language': 'en',
-            'pageSize': max_items * 2,  # Get more to filter and sort
-            'apiKey': NEWSAPI_KEY
-        }
-        
-        logger.info(f"Fetching monthly news for {topic} from {from_date} to {to_date}")
-        response = requests.get(url, params=params, timeout=30)
-        response.raise_for_status()
-        
-        data = response.json()
-        articles = data.get('articles', [])
-        
-        # Convert to our format
-        news_items = []
-        for article in articles:
-            if article.get('title') and article.get('description'):
-                news_item = {
-                    'title': article['title'],
-                    'summary': article['description'],
-                    'url': article.get('url', '#'),
-                    'source': article.get('source', {}).get('name', 'Unknown'),
-                    'published_at': article.get('publishedAt', ''),
-                    'why_it_matters': f"This {topic.lower()} news is significant for staying informed about recent developments and trends in the field."
-                }
-                news_items.append(news_item)
-        
-        # Sort by date and limit
-        sorted_items = sort_news_by_date(news_items)
-        return sorted_items[:max_items]
+        params = _monthly_params(topic, max_items)
+        
+        # Revalidate with the last ETag: an unchanged result comes back as an empty 304
+        etag_key = ("everything", topic, max_items)
+        with _etag_lock:
+            cached = _etag_cache.get(etag_key)
+        request_headers = {"If-None-Match": cached[0]} if cached else None
+        
+        logger.info(f"Fetching monthly news for {topic} from {params['from']} to {params['to']}")
+        result = _get_newsapi(params, request_headers, topic, max_items)
+        if result is None:
+            if not cached:
+                return []
+            logger.info(f"Monthly news for {topic} not modified, reusing previous result")
+            return list(cached[1])
+        
+        etag, sorted_items = result
+        _remember_etag(etag_key, etag, sorted_items)
+        return list(sorted_items)
         
     except requests.exceptions.RequestException as e:
         logger.error(f"News API request failed for {topic}: {e}")
         return []
+    except CircuitOpenError as e:
+        # Open, or half-open with the one probe already in flight
+        logger.warning(f"Skipping News API fetch for {topic}: {e}")
+        return []
     except Exception as e:
         logger.error(f"Error processing News API response for {topic}: {e}")
         return []
 
-@retry_with_backoff(max_attempts=3, base_delay=1.0, exceptions=(requests.RequestException,))
-def fetch_news_perplexity(topic: str, max_items: int = 2):
-    """Fetch news using Perplexity API for more intelligent and comprehensive news"""
-    url = "https://api.perplexity.ai/chat/completions"
-    
-    # Create intelligent prompts for different topics
-    topic_prompts = {
-        "Technology": f"Find the top {max_items} most important and recent technology news stories from the last 7 days. Include AI, software, hardware, startups, and tech industry developments. For each story, provide: 1) A compelling headline, 2) A detailed summary explaining the significance, 3) Why this matters to tech professionals and enthusiasts, 4) The source/publication, 5) A relevant URL if available, 6) The exact publication date in YYYY-MM-DD format. Format as JSON array with fields: title, summary, why_it_matters, source, url, published_at.",
-        
-        "Sports": f"Find the top {max_items} most important and recent sports news stories from the last 7 days. Include major leagues (NFL, NBA, MLB, NHL, Premier League, etc.), Olympics, major tournaments, and significant sports developments. For each story, provide: 1) A compelling headline, 2) A detailed summary explaining the significance, 3) Why this matters to sports fans, 4) The source/publication, 5) A relevant URL if available, 6) The exact publication date in YYYY-MM-DD format. Format as JSON array with fields: title, summary, why_it_matters, source, url, published_at.",
-        
-        "Politics": f"Find the top {max_items} most important and recent political news stories from the last 7 days. Include government policy, elections, international relations, and significant political developments. For each story, provide: 1) A compelling headline, 2) A detailed summary explaining the significance, 3) Why this matters to citizens and policy makers, 4) The source/publication, 5) A relevant URL if available, 6) The exact publication date in YYYY-MM-DD format. Format as JSON array with fields: title, summary, why_it_matters, source, url, published_at.",
-        
-        "Finance": f"Find the top {max_items} most important and recent financial news stories from the last 7 days. Include market movements, economic policy, corporate earnings, cryptocurrency, and significant financial developments. For each story, provide: 1) A compelling headline, 2) A detailed summary explaining the significance, 3) Why this matters to investors and business professionals, 4) The source/publication, 5) A relevant URL if available, 6) The exact publication date in YYYY-MM-DD format. Format as JSON array with fields: title, summary, why_it_matters, source, url, published_at."
-    }
-    
-    prompt = topic_prompts.get(topic, f"Find the top {max_items} most important and recent news stories about {topic}.")
+# First markdown code fence, optionally tagged json; an unterminated fence
+# runs to the end of the reply
+_FENCE_RE = re.compile(r'```(?:json)?\s*(.*?)(?:```|\Z)', re.S)
+
+@lru_cache(maxsize=32)
+def _get_prompt(topic: str, max_items: int) -> str:
+    """Topic prompt with the story count filled in"""
+    return _TOPIC_PROMPT_TEMPLATES.get(topic, _DEFAULT_PROMPT).format(n=max_items, topic=topic)
+
+def _perplexity_request(topic: str, max_items: int):
+    """Headers and JSON body for a Perplexity news query"""
+    prompt = _get_prompt(topic, max_items)
     
     headers = {
         "Authorization": f"Bearer {PERPLEXITY_API_KEY}",
@@ -135,125 +233,153 @@ def fetch_news_perplexity(topic: str, max_items: int = 2):
         "max_tokens": 2000,
         "temperature": 0.3
     }
+    return headers, data
+
+def _parse_perplexity_result(result: dict, topic: str, max_items: int) -> list:
+    """Pull the news items out of a Perplexity chat completion"""
+    content = result.get("choices", [{}])[0].get("message", {}).get("content", "")
     
+    # Try to parse JSON from the response
     try:
-        response = requests.post(url, headers=headers, json=data, timeout=60)
-        response.raise_for_status()
-        
-        result = response.json()
-        content = result.get("choices", [{}])[0].get("message", {}).get("content", "")
-        
-        # Try to parse JSON from the response
-        try:
-            # Extract JSON from the response (it might be wrapped in markdown)
-            if "```json" in content:
-                json_start = content.find("```json") + 7
-                json_end = content.find("```", json_start)
-                json_content = content[json_start:json_end].strip()
-            elif "```" in content:
-                json_start = content.find("```") + 3
-                json_end = content.find("```", json_start)
-                json_content = content[json_start:json_end].strip()
-            else:
-                json_content = content.strip()
-            
-            # Try to parse as JSON array
-            news_items = json.loads(json_content)
-            if isinstance(news_items, list):
-                # Sort by date (newest first) and limit items
-                sorted_items = sort_news_by_date(news_items)
-                return sorted_items[:max_items]
-            elif isinstance(news_items, dict):
-                return [news_items]
-        except json.JSONDecodeError:
-            # If JSON parsing fails, create structured data from text
-            logger.warning(f"Failed to parse JSON from Perplexity response for {topic}, creating structured data")
-            return create_structured_news_from_text(content, topic, max_items)
-        
-        return []
+        # Extract JSON from the response (it might be wrapped in markdown)
+        m = _FENCE_RE.search(content)
+        json_content = m.group(1).strip() if m else content.strip()
+        
+        # Try to parse as JSON array
+        news_items = _json_loads(json_content)
+        if isinstance(news_items, list):
+            # Sort by date (newest first) and limit items
+            sorted_items = sort_news_by_date(news_items)
+            return sorted_items[:max_items]
+        elif isinstance(news_items, dict):
+            return [news_items]
+    except json.JSONDecodeError:
+        # If JSON parsing fails, create structured data from text
+        logger.warning(f"Failed to parse JSON from Perplexity response for {topic}, creating structured data")
+        return create_structured_news_from_text(content, topic, max_items)
+    
+    return []
+
+# Retry only, no breaker: a run of failures must not blank every topic
+# (daily send included) for the breaker's recovery window
+@resilient(max_attempts=3, base_delay=1.0, exceptions=(requests.RequestException,))
+def _post_perplexity(headers: dict, data: dict) -> dict:
+    """POST a chat completion; network errors propagate so they can be retried"""
+    response = _session.post(_PERPLEXITY_URL, headers=headers, json=data, timeout=60)
+    response.raise_for_status()
+    return _json_loads(response.content)
+
+def fetch_news_perplexity(topic: str, max_items: int = 2):
+    """Fetch news using Perplexity API for more intelligent and comprehensive news"""
+    headers, data = _perplexity_request(topic, max_items)
+    
+    try:
+        return _parse_perplexity_result(_post_perplexity(headers, data), topic, max_items)
         
     except Exception as e:
         logger.error(f"Perplexity API failed for {topic}: {e}")
         # Return empty list if Perplexity fails
         return []
 
+# Long-lived threads for fetch_all_news, kept apart from the web app's
+# homepage pool so slow Perplexity calls can't starve it
+_FETCH_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="news-fetch")
+
+def fetch_all_news(topics, fetcher=fetch_news_perplexity, max_items: int = 2):
+    """
+    Fetch news for several topics in parallel threads (requests releases the
+    GIL while waiting on the socket). Returns {topic: items} in topic order;
+    a topic whose fetch raises gets an empty list.
+    """
+    topics = list(topics)
+    if not topics:
+        return {}
+    
+    def fetch(topic):
+        try:
+            return fetcher(topic, max_items)
+        except Exception as e:
+            logger.error(f"Failed to fetch news for {topic}: {e}")
+            return []
+    
+    return dict(zip(topics, _FETCH_POOL.map(fetch, topics)))
+
+# One pass over the fallback text: each match is either a "field: value" line
+# (group 1 set) or a blank line that ends the current item (group 1 None)
+_FIELD_RE = re.compile(
+    r'^[ \t]*(?:(title|headline|summary|why it matters|significance|source|url|published)'
+    r'[ \t]*:[ \t]*(.*?))?[ \t]*\r?$',
+    re.IGNORECASE | re.MULTILINE,
+)
+_FIELD_NAMES = {
+    "title": "title",
+    "headline": "title",
+    "summary": "summary",
+    "why it matters": "why_it_matters",
+    "significance": "why_it_matters",
+    "source": "source",
+    "url": "url",
+    "published": "published_at",
+}
+
 def create_structured_news_from_text(content: str, topic: str, max_items: int):
     """Create structured news data from Perplexity text response when JSON parsing fails"""
     items = []
-    lines = content.split('\n')
     current_item = {}
     
-    for line in lines:
-        line = line.strip()
-        if not line:
-            if current_item:
-                items.append(current_item)
-                current_item = {}
-            continue
-            
-        if line.lower().startswith('title:') or line.lower().startswith('headline:'):
-            current_item['title'] = line.split(':', 1)[1].strip()
-        elif line.lower().startswith('summary:'):
-            current_item['summary'] = line.split(':', 1)[1].strip()
-        elif line.lower().startswith('why it matters:') or line.lower().startswith('significance:'):
-            current_item['why_it_matters'] = line.split(':', 1)[1].strip()
-        elif line.lower().startswith('source:'):
-            current_item['source'] = line.split(':', 1)[1].strip()
-        elif line.lower().startswith('url:'):
-            current_item['url'] = line.split(':', 1)[1].strip()
-        elif line.lower().startswith('published:'):
-            current_item['published_at'] = line.split(':', 1)[1].strip()
+    for match in _FIELD_RE.finditer(content):
+        name = match.group(1)
+        field = _FIELD_NAMES[name.lower()] if name else None
+        # A blank line, or a field we already have, starts the next item
+        if current_item and (field is None or field in current_item):
+            items.append(current_item)
+            current_item = {}
+        if field:
+            current_item[field] = match.group(2)
     
     # Add the last item if exists
     if current_item:
         items.append(current_item)
     
     # Ensure all items have required fields
-    for item in items:
-        item.setdefault('title', f'Latest {topic} News')
-        item.setdefault('summary', f'Important development in {topic}')
-        item.setdefault('why_it_matters', f'This story is significant for {topic} enthusiasts and professionals')
-        item.setdefault('source', 'Perplexity AI')
-        item.setdefault('url', '#')
-        item.setdefault('published_at', datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ'))
+    defaults = {
+        'title': f'Latest {topic} News',
+        'summary': f'Important development in {topic}',
+        'why_it_matters': f'This story is significant for {topic} enthusiasts and professionals',
+        'source': 'Perplexity AI',
+        'url': '#',
+        'published_at': datetime.now().strftime('%Y-%m-%dT%H:%M:%SZ'),
+    }
+    items = [{**defaults, **item} for item in items]
     
     # Sort by date and limit items
     sorted_items = sort_news_by_date(items)
     return sorted_items[:max_items]
 
-def build_html(all_news: dict, base_url: str = "http://localhost:5000"):
-    """Build a professional, modern email template for news"""
-    current_date = datetime.now().strftime("%B %d, %Y")
-    current_time = datetime.now().strftime("%I:%M %p")
-    
-    parts = [
-        f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>AI Newsletter - Daily Digest</title>
-    <style>
+# --- Newsletter email templates (built once at import) ---
+
+# Newsletter stylesheet as written; minified once below before going into every email
+_RAW_CSS = """
         @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800&display=swap');
         
-        .email-container {{
+        .email-container {
             max-width: 800px;
             margin: 0 auto;
             background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
             border-radius: 20px;
             overflow: hidden;
             box-shadow: 0 25px 50px rgba(0, 0, 0, 0.15);
-        }}
+        }
         
-        .header {{
+        .header {
             background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
             padding: 60px 50px;
             text-align: center;
             position: relative;
             overflow: hidden;
-        }}
+        }
         
-        .header::before {{
+        .header::before {
             content: '';
             position: absolute;
             top: -50%;
@@ -262,19 +388,19 @@ def build_html(all_news: dict, base_url: str = "http://localhost:5000"):
             height: 200%;
             background: radial-gradient(circle, rgba(255,255,255,0.1) 0%, transparent 70%);
             animation: float 6s ease-in-out infinite;
-        }}
+        }
         
-        @keyframes float {{
-            0%, 100% {{ transform: translateY(0px) rotate(0deg); }}
-            50% {{ transform: translateY(-20px) rotate(180deg); }}
-        }}
+        @keyframes float {
+            0%, 100% { transform: translateY(0px) rotate(0deg); }
+            50% { transform: translateY(-20px) rotate(180deg); }
+        }
         
-        .header-content {{
+        .header-content {
             position: relative;
             z-index: 2;
-        }}
+        }
         
-        .logo {{
+        .logo {
             font-family: 'Inter', sans-serif;
             font-size: 48px;
             font-weight: 800;
@@ -282,45 +408,45 @@ def build_html(all_news: dict, base_url: str = "http://localhost:5000"):
             margin: 0 0 16px 0;
             letter-spacing: -1px;
             text-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        }}
+        }
         
-        .tagline {{
+        .tagline {
             font-family: 'Inter', sans-serif;
             font-size: 20px;
             font-weight: 500;
             color: #e2e8f0;
             margin: 0 0 12px 0;
             letter-spacing: 0.5px;
-        }}
+        }
         
-        .date-time {{
+        .date-time {
             font-family: 'Inter', sans-serif;
             font-size: 14px;
             color: #cbd5e1;
             margin: 0;
             font-weight: 400;
-        }}
+        }
         
-        .content {{
+        .content {
             background: #ffffff;
             padding: 60px 50px;
-        }}
+        }
         
-        .intro {{
+        .intro {
             text-align: center;
             margin-bottom: 60px;
-        }}
+        }
         
-        .intro h2 {{
+        .intro h2 {
             font-family: 'Inter', sans-serif;
             font-size: 32px;
             font-weight: 700;
             color: #1e293b;
             margin: 0 0 20px 0;
             letter-spacing: -0.5px;
-        }}
+        }
         
-        .intro p {{
+        .intro p {
             font-family: 'Inter', sans-serif;
             font-size: 18px;
             color: #64748b;
@@ -328,36 +454,36 @@ def build_html(all_news: dict, base_url: str = "http://localhost:5000"):
             line-height: 1.6;
             max-width: 600px;
             margin: 0 auto;
-        }}
+        }
         
-        .topic-section {{
+        .topic-section {
             margin-bottom: 60px;
-        }}
+        }
         
-        .topic-header {{
+        .topic-header {
             display: flex;
             align-items: center;
             margin-bottom: 40px;
             padding-bottom: 20px;
             border-bottom: 3px solid #f1f5f9;
-        }}
+        }
         
-        .topic-icon {{
+        .topic-icon {
             font-size: 32px;
             margin-right: 20px;
             filter: drop-shadow(0 2px 4px rgba(0,0,0,0.1));
-        }}
+        }
         
-        .topic-title {{
+        .topic-title {
             font-family: 'Inter', sans-serif;
             font-size: 26px;
             font-weight: 700;
             color: #1e293b;
             margin: 0;
             letter-spacing: -0.3px;
-        }}
+        }
         
-        .news-card {{
+        .news-card {
             background: linear-gradient(135deg, #f8fafc 0%, #ffffff 100%);
             border-radius: 20px;
             padding: 40px;
@@ -367,9 +493,9 @@ def build_html(all_news: dict, base_url: str = "http://localhost:5000"):
             transition: all 0.3s ease;
             position: relative;
             overflow: hidden;
-        }}
+        }
         
-        .news-card::before {{
+        .news-card::before {
             content: '';
             position: absolute;
             top: 0;
@@ -377,21 +503,21 @@ def build_html(all_news: dict, base_url: str = "http://localhost:5000"):
             width: 4px;
             height: 100%;
             background: linear-gradient(135deg, #3b82f6 0%, #8b5cf6 100%);
-        }}
+        }
         
-        .news-card:hover {{
+        .news-card:hover {
             transform: translateY(-2px);
             box-shadow: 0 8px 25px rgba(0, 0, 0, 0.1);
-        }}
+        }
         
-        .news-header {{
+        .news-header {
             display: flex;
             justify-content: space-between;
             align-items: flex-start;
             margin-bottom: 25px;
-        }}
+        }
         
-        .news-title {{
+        .news-title {
             font-family: 'Inter', sans-serif;
             font-size: 22px;
             font-weight: 700;
@@ -400,9 +526,9 @@ def build_html(all_news: dict, base_url: str = "http://localhost:5000"):
             line-height: 1.4;
             flex: 1;
             margin-right: 20px;
-        }}
+        }
         
-        .news-badge {{
+        .news-badge {
             background: linear-gradient(135deg, #3b82f6 0%, #8b5cf6 100%);
             color: #ffffff;
             font-family: 'Inter', sans-serif;
@@ -412,26 +538,26 @@ def build_html(all_news: dict, base_url: str = "http://localhost:5000"):
             border-radius: 20px;
             white-space: nowrap;
             box-shadow: 0 2px 4px rgba(59, 130, 246, 0.3);
-        }}
+        }
         
-        .news-summary {{
+        .news-summary {
             font-family: 'Inter', sans-serif;
             font-size: 17px;
             color: #475569;
             line-height: 1.7;
             margin: 0 0 25px 0;
-        }}
+        }
         
-        .why-matters {{
+        .why-matters {
             background: linear-gradient(135deg, #fef3c7 0%, #fde68a 100%);
             border: 1px solid #f59e0b;
             border-radius: 16px;
             padding: 25px;
             margin: 25px 0;
             position: relative;
-        }}
+        }
         
-        .why-matters::before {{
+        .why-matters::before {
             content: '💡';
             position: absolute;
             top: -8px;
@@ -439,9 +565,9 @@ def build_html(all_news: dict, base_url: str = "http://localhost:5000"):
             background: #ffffff;
             padding: 0 8px;
             font-size: 16px;
-        }}
+        }
         
-        .why-matters-title {{
+        .why-matters-title {
             font-family: 'Inter', sans-serif;
             font-size: 14px;
             font-weight: 700;
@@ -449,32 +575,32 @@ def build_html(all_news: dict, base_url: str = "http://localhost:5000"):
             margin: 0 0 8px 0;
             text-transform: uppercase;
             letter-spacing: 0.5px;
-        }}
+        }
         
-        .why-matters-text {{
+        .why-matters-text {
             font-family: 'Inter', sans-serif;
             font-size: 14px;
             color: #92400e;
             margin: 0;
             line-height: 1.5;
-        }}
+        }
         
-        .news-footer {{
+        .news-footer {
             display: flex;
             justify-content: space-between;
             align-items: center;
             margin-top: 25px;
             padding-top: 25px;
             border-top: 1px solid #e2e8f0;
-        }}
+        }
         
-        .news-meta {{
+        .news-meta {
             display: flex;
             align-items: center;
             gap: 25px;
-        }}
+        }
         
-        .meta-item {{
+        .meta-item {
             font-family: 'Inter', sans-serif;
             font-size: 13px;
             color: #64748b;
@@ -482,9 +608,9 @@ def build_html(all_news: dict, base_url: str = "http://localhost:5000"):
             display: flex;
             align-items: center;
             gap: 6px;
-        }}
+        }
         
-        .read-more-btn {{
+        .read-more-btn {
             background: linear-gradient(135deg, #3b82f6 0%, #8b5cf6 100%);
             color: #ffffff;
             text-decoration: none;
@@ -495,33 +621,33 @@ def build_html(all_news: dict, base_url: str = "http://localhost:5000"):
             border-radius: 25px;
             box-shadow: 0 4px 12px rgba(59, 130, 246, 0.3);
             transition: all 0.3s ease;
-        }}
+        }
         
-        .read-more-btn:hover {{
+        .read-more-btn:hover {
             transform: translateY(-1px);
             box-shadow: 0 6px 20px rgba(59, 130, 246, 0.4);
-        }}
+        }
         
-        .footer {{
+        .footer {
             background: linear-gradient(135deg, #f8fafc 0%, #e2e8f0 100%);
             padding: 50px;
             text-align: center;
             border-top: 1px solid #e2e8f0;
-        }}
+        }
         
-        .footer-content {{
+        .footer-content {
             margin-bottom: 40px;
-        }}
+        }
         
-        .footer h4 {{
+        .footer h4 {
             font-family: 'Inter', sans-serif;
             font-size: 20px;
             font-weight: 700;
             color: #1e293b;
             margin: 0 0 16px 0;
-        }}
+        }
         
-        .footer p {{
+        .footer p {
             font-family: 'Inter', sans-serif;
             font-size: 16px;
             color: #64748b;
@@ -529,16 +655,16 @@ def build_html(all_news: dict, base_url: str = "http://localhost:5000"):
             line-height: 1.6;
             max-width: 500px;
             margin: 0 auto;
-        }}
+        }
         
-        .footer-actions {{
+        .footer-actions {
             display: flex;
             justify-content: center;
             gap: 25px;
             margin: 40px 0;
-        }}
+        }
         
-        .footer-btn {{
+        .footer-btn {
             font-family: 'Inter', sans-serif;
             font-size: 15px;
             font-weight: 600;
@@ -546,113 +672,136 @@ def build_html(all_news: dict, base_url: str = "http://localhost:5000"):
             border-radius: 25px;
             text-decoration: none;
             transition: all 0.3s ease;
-        }}
+        }
         
-        .footer-btn.manage {{
+        .footer-btn.manage {
             background: #3b82f6;
             color: #ffffff;
             border: 1px solid #3b82f6;
-        }}
+        }
         
-        .footer-btn.unsubscribe {{
+        .footer-btn.unsubscribe {
             background: #ffffff;
             color: #ef4444;
             border: 1px solid #ef4444;
-        }}
+        }
         
-        .footer-btn:hover {{
+        .footer-btn:hover {
             transform: translateY(-1px);
             box-shadow: 0 4px 12px rgba(0, 0, 0, 0.1);
-        }}
+        }
         
-        .footer-bottom {{
+        .footer-bottom {
             border-top: 1px solid #e2e8f0;
             padding-top: 20px;
             margin-top: 20px;
-        }}
+        }
         
-        .footer-bottom p {{
+        .footer-bottom p {
             font-family: 'Inter', sans-serif;
             font-size: 12px;
             color: #94a3b8;
             margin: 0 0 8px 0;
-        }}
+        }
         
-        .powered-by {{
+        .powered-by {
             font-family: 'Inter', sans-serif;
             font-size: 12px;
             color: #94a3b8;
             margin: 0;
             font-weight: 500;
-        }}
+        }
         
-        @media (max-width: 600px) {{
-            .email-container {{
+        @media (max-width: 600px) {
+            .email-container {
                 margin: 0;
                 border-radius: 0;
-            }}
+            }
             
-            .header, .content, .footer {{
+            .header, .content, .footer {
                 padding: 40px 25px;
-            }}
+            }
             
-            .logo {{
+            .logo {
                 font-size: 36px;
-            }}
+            }
             
-            .tagline {{
+            .tagline {
                 font-size: 18px;
-            }}
+            }
             
-            .intro h2 {{
+            .intro h2 {
                 font-size: 28px;
-            }}
+            }
             
-            .intro p {{
+            .intro p {
                 font-size: 16px;
-            }}
+            }
             
-            .topic-title {{
+            .topic-title {
                 font-size: 22px;
-            }}
+            }
             
-            .news-card {{
+            .news-card {
                 padding: 30px;
                 margin-bottom: 30px;
-            }}
+            }
             
-            .news-title {{
+            .news-title {
                 font-size: 20px;
-            }}
+            }
             
-            .news-summary {{
+            .news-summary {
                 font-size: 16px;
-            }}
+            }
             
-            .news-header {{
+            .news-header {
                 flex-direction: column;
                 align-items: flex-start;
-            }}
+            }
             
-            .news-badge {{
+            .news-badge {
                 margin-top: 12px;
-            }}
+            }
             
-            .news-footer {{
+            .news-footer {
                 flex-direction: column;
                 align-items: flex-start;
                 gap: 20px;
-            }}
+            }
             
-            .footer-actions {{
+            .footer-actions {
                 flex-direction: column;
                 align-items: center;
                 gap: 15px;
-            }}
-        }}
-    </style>
+            }
+        }
+"""
+
+def _minify_css(css: str) -> str:
+    """
+    Strip comments and collapse whitespace around CSS punctuation. One rule
+    per line keeps the body under the SMTP line limit for the raw send path.
+    """
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};:,>])\s*', r'\1', css)
+    return css.replace(';}', '}').replace('}', '}\n').strip()
+
+_MIN_CSS = _minify_css(_RAW_CSS)
+
+# Document head and styles; fully static
+_HTML_HEAD = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>AI Newsletter - Daily Digest</title>
+    <style>""" + _MIN_CSS + """</style>
 </head>
-<body style="margin: 0; padding: 30px; background-color: #f1f5f9; font-family: 'Inter', sans-serif;">
+<body style="margin: 0; padding: 30px; background-color: #f1f5f9; font-family: 'Inter', sans-serif;">"""
+
+_MASTHEAD_TEMPLATE = """
     <div class="email-container">
         
         <!-- Header -->
@@ -671,74 +820,52 @@ def build_html(all_news: dict, base_url: str = "http://localhost:5000"):
                 <p>Curated insights powered by AI to keep you informed and ahead of the curve</p>
             </div>
         """
-    ]
-    
-    # Add news sections
-    for topic, stories in all_news.items():
-        if not stories:
-            continue
-            
-        # Topic header with icon
-        topic_icons = {
-            "Technology": "💻",
-            "Sports": "⚽",
-            "Politics": "🏛️",
-            "Finance": "💰"
-        }
-        icon = topic_icons.get(topic, "📰")
-        
-        parts.append(f"""
-            <div class="topic-section">
-                <div class="topic-header">
-                    <span class="topic-icon">{icon}</span>
-                    <h3 class="topic-title">{topic}</h3>
+
+_TOPIC_ICONS = {
+    "Technology": "💻",
+    "Sports": "⚽",
+    "Politics": "🏛️",
+    "Finance": "💰"
+}
+
+_TOPIC_HEADER_TEMPLATE = """
+        <div class="topic-section">
+            <div class="topic-header">
+                <span class="topic-icon">{icon}</span>
+                <h3 class="topic-title">{topic}</h3>
+            </div>
+    """
+
+# Cards use %-formatting; every value is HTML-escaped before substitution
+_CARD_FMT = """
+            <div class="news-card">
+                <div class="news-header">
+                    <h4 class="news-title">%(title)s</h4>
+                    <span class="news-badge">#%(index)d</span>
                 </div>
-        """)
-        
-        # Add stories
-        for i, story in enumerate(stories, 1):
-            title = story.get("title", "No title")
-            summary = story.get("summary", "No summary available")
-            why_matters = story.get("why_it_matters", "")
-            url = story.get("url", "#")
-            source = story.get("source", "Various Sources")
-            published_at = story.get("published_at", "")
-            
-            # Format published date
-            try:
-                if published_at:
-                    pub_date = datetime.fromisoformat(published_at.replace('Z', '+00:00'))
-                    formatted_date = pub_date.strftime("%b %d, %Y")
-                else:
-                    formatted_date = "Recent"
-            except:
-                formatted_date = "Recent"
-            
-            parts.append(f"""
-                <div class="news-card">
-                    <div class="news-header">
-                        <h4 class="news-title">{title}</h4>
-                        <span class="news-badge">#{i}</span>
-                    </div>
-                    
-                    <p class="news-summary">{summary}</p>
-                    
-                    {f'<div class="why-matters"><div class="why-matters-title">Why This Matters</div><div class="why-matters-text">{why_matters}</div></div>' if why_matters else ''}
-                    
-                    <div class="news-footer">
-                        <div class="news-meta">
-                            <div class="meta-item">📅 {formatted_date}</div>
-                            <div class="meta-item">📰 {source}</div>
-                        </div>
-                        {f'<a href="{url}" class="read-more-btn">Read More →</a>' if url != '#' else ''}
+                
+                <p class="news-summary">%(summary)s</p>
+                
+                %(why_matters_block)s
+                
+                <div class="news-footer">
+                    <div class="news-meta">
+                        <div class="meta-item">📅 %(formatted_date)s</div>
+                        <div class="meta-item">📰 %(source)s</div>
                     </div>
+                    %(read_more)s
                 </div>
-            """)
-        
-        parts.append("</div>")
-    
-    # Add footer
-    parts.append(f"""
+            </div>
+        """
+
+_WHY_MATTERS_FMT = '<div class="why-matters"><div class="why-matters-title">Why This Matters</div><div class="why-matters-text">%s</div></div>'
+_READ_MORE_FMT = '<a href="%s" class="read-more-btn">Read More →</a>'
+
+# Card dates only need Y-M-D off the front of the ISO string
+_DATE_RE = re.compile(r'^(\d{4})-(\d{2})-(\d{2})')
+_MONTHS = ("", "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+_FOOTER_TEMPLATE = """
         </div>
         
         <!-- Footer -->
@@ -761,6 +888,83 @@ def build_html(all_news: dict, base_url: str = "http://localhost:5000"):
     </div>
 </body>
 </html>
-    """)
+    """
+
+def _build_html_header():
+    """Opening of the newsletter: document head, styles, masthead and intro"""
+    now = datetime.now()
+    return _HTML_HEAD + _MASTHEAD_TEMPLATE.format(
+        current_date=now.strftime("%B %d, %Y"),
+        current_time=now.strftime("%I:%M %p"),
+    )
+
+def _render_card(index: int, story: dict) -> str:
+    """Render a single news card"""
+    why_matters = story.get("why_it_matters", "")
+    url = story.get("url", "#")
+    
+    # Format published date
+    m = _DATE_RE.match(str(story.get("published_at") or ""))
+    month = int(m.group(2)) if m else 0
+    formatted_date = f"{_MONTHS[month]} {m.group(3)}, {m.group(1)}" if 1 <= month <= 12 else "Recent"
     
-    return "".join(parts)
\ No newline at end of file
+    # html.escape's chained str.replace calls beat a str.translate table here:
+    # translate with multi-character replacements drops to a slow per-char path
+    return _CARD_FMT % {
+        "title": escape(str(story.get("title", "No title"))),
+        "index": index,
+        "summary": escape(str(story.get("summary", "No summary available"))),
+        "why_matters_block": _WHY_MATTERS_FMT % escape(str(why_matters)) if why_matters else '',
+        "formatted_date": formatted_date,
+        "source": escape(str(story.get("source", "Various Sources"))),
+        "read_more": _READ_MORE_FMT % escape(str(url)) if url != '#' else '',
+    }
+
+def _dedupe_stories(stories, seen: set) -> list:
+    """Drop stories whose url (or title, for '#' links) is already in seen"""
+    kept = []
+    for story in stories:
+        url = story.get("url")
+        key = url if url and url != "#" else story.get("title")
+        if key in seen:
+            continue
+        if key:
+            seen.add(key)
+        kept.append(story)
+    return kept
+
+def build_html_section(topic: str, stories: list, seen: set = None) -> str:
+    """
+    Render one topic's block of news cards ("" when there are no stories).
+    Pass the same seen set for every section of a newsletter so a story that
+    several topics picked up is only shown under the first one rendered.
+    """
+    if seen is not None:
+        stories = _dedupe_stories(stories, seen)
+    if not stories:
+        return ""
+    
+    # Topic header with icon
+    icon = _TOPIC_ICONS.get(topic, "📰")
+    
+    return "".join(chain(
+        (_TOPIC_HEADER_TEMPLATE.format(icon=icon, topic=topic),),
+        (_render_card(i, story) for i, story in enumerate(stories, 1)),
+        ("</div>",),
+    ))
+
+def _build_html_footer(base_url: str):
+    """Closing of the newsletter with manage/unsubscribe links"""
+    return _FOOTER_TEMPLATE.format(base_url=base_url)
+
+def build_html_from_sections(sections, base_url: str = "http://localhost:5000"):
+    """Wrap already rendered topic sections into the full newsletter document"""
+    return "".join(chain((_build_html_header(),), sections, (_build_html_footer(base_url),)))
+
+def build_html(all_news: dict, base_url: str = "http://localhost:5000"):
+    """Build a professional, modern email template for news"""
+    seen = set()
+    return build_html_from_sections(
+        (build_html_section(topic, stories, seen) for topic, stories in all_news.items()),
+        base_url,
+    )
@@ -2,22 +2,43 @@
 Retry utilities for external API calls
 """
 import time
+import random
 import logging
+import threading
 from functools import wraps
 from typing import Callable, Any, Optional
 
 logger = logging.getLogger(__name__)
 
+JITTER_MODES = ("none", "equal", "full")
+
+def jittered_delay(cap: float, jitter: str = "full") -> float:
+    """
+    Sleep time for a backoff step capped at cap seconds, randomized so callers
+    that fail together don't all retry at the same instant. "full" picks
+    uniformly in [0, cap], "equal" in [cap/2, cap], "none" returns cap.
+    """
+    if jitter == "full":
+        return random.uniform(0, cap)
+    if jitter == "equal":
+        return cap / 2 + random.uniform(0, cap / 2)
+    if jitter == "none":
+        return cap
+    raise ValueError(f"Unknown jitter mode: {jitter!r}")
+
 def retry_with_backoff(
     max_attempts: int = 3,
     base_delay: float = 1.0,
     max_delay: float = 60.0,
     backoff_multiplier: float = 2.0,
-    exceptions: tuple = (Exception,)
+    exceptions: tuple = (Exception,),
+    jitter: str = "full"
 ):
     """
     Decorator that retries a function with exponential backoff
     """
+    if jitter not in JITTER_MODES:
+        raise ValueError(f"Unknown jitter mode: {jitter!r}")
     def decorator(func: Callable) -> Callable:
         @wraps(func)
         def wrapper(*args, **kwargs) -> Any:
@@ -35,9 +56,10 @@ def retry_with_backoff(
                         raise e
                     
                     # Calculate delay with exponential backoff
-                    delay = min(base_delay * (backoff_multiplier ** attempt), max_delay)
+                    cap = min(base_delay * (backoff_multiplier ** attempt), max_delay)
+                    delay = jittered_delay(cap, jitter)
                     
-                    logger.warning(f"Function {func.__name__} failed (attempt {attempt + 1}/{max_attempts}): {e}. Retrying in {delay:.1f}s")
+                    logger.warning(f"Function {func.__name__} failed (attempt {attempt + 1}/{max_attempts}): {e}. Retrying in {delay:.1f}s (cap {cap:.1f}s)")
                     time.sleep(delay)
             
             # This should never be reached, but just in case
@@ -46,6 +68,9 @@ def retry_with_backoff(
         return wrapper
     return decorator
 
+class CircuitOpenError(Exception):
+    """Raised instead of calling through while a circuit breaker is open"""
+
 class CircuitBreaker:
     """
     Simple circuit breaker pattern implementation
@@ -57,15 +82,14 @@ class CircuitBreaker:
         self.failure_count = 0
         self.last_failure_time = None
         self.state = 'CLOSED'  # CLOSED, OPEN, HALF_OPEN
+        self._half_open_inflight = 0  # probes admitted while HALF_OPEN (at most 1)
+        self._lock = threading.Lock()
     
     def __call__(self, func: Callable) -> Callable:
         @wraps(func)
         def wrapper(*args, **kwargs) -> Any:
-            if self.state == 'OPEN':
-                if self._should_attempt_reset():
-                    self.state = 'HALF_OPEN'
-                else:
-                    raise Exception(f"Circuit breaker is OPEN for {func.__name__}")
+            if not self.allow():
+                raise CircuitOpenError(f"Circuit breaker is {self.state} for {func.__name__}")
             
             try:
                 result = func(*args, **kwargs)
@@ -74,28 +98,114 @@ class CircuitBreaker:
             except Exception as e:
                 self._on_failure()
                 raise e
+            except BaseException:
+                self._release_probe()
+                raise
         
         return wrapper
     
+    def allow(self) -> bool:
+        """
+        Whether a call may go through now. Once the recovery timeout passes,
+        OPEN moves to HALF_OPEN and exactly one probe call is admitted; the
+        rest are turned away until that probe succeeds or fails.
+        """
+        with self._lock:
+            if self.state == 'CLOSED':
+                return True
+            if self.state == 'OPEN':
+                if not self._should_attempt_reset():
+                    return False
+                self.state = 'HALF_OPEN'
+            if self._half_open_inflight:
+                return False
+            self._half_open_inflight = 1
+            return True
+    
     def _should_attempt_reset(self) -> bool:
         """Check if enough time has passed to attempt reset"""
         if self.last_failure_time is None:
             return True
         return time.time() - self.last_failure_time >= self.recovery_timeout
     
+    def _release_probe(self):
+        """
+        Free the half-open probe slot without counting a result, for calls
+        cut short by a BaseException (gevent Timeout, GreenletExit,
+        KeyboardInterrupt) that says nothing about the upstream service.
+        """
+        with self._lock:
+            self._half_open_inflight = 0
+    
     def _on_success(self):
         """Reset circuit breaker on successful call"""
-        self.failure_count = 0
-        self.state = 'CLOSED'
+        with self._lock:
+            self.failure_count = 0
+            self.state = 'CLOSED'
+            self._half_open_inflight = 0
     
     def _on_failure(self):
         """Handle failure - increment count and potentially open circuit"""
-        self.failure_count += 1
-        self.last_failure_time = time.time()
+        with self._lock:
+            self.failure_count += 1
+            self.last_failure_time = time.time()
+            self._half_open_inflight = 0
+            
+            if self.failure_count >= self.failure_threshold:
+                self.state = 'OPEN'
+                logger.warning(f"Circuit breaker opened after {self.failure_count} failures")
+
+def resilient(
+    max_attempts: int = 3,
+    base_delay: float = 1.0,
+    breaker: Optional[CircuitBreaker] = None,
+    exceptions: tuple = (Exception,),
+    max_delay: float = 60.0,
+    backoff_multiplier: float = 2.0,
+    jitter: str = "full"
+):
+    """
+    retry_with_backoff inside a circuit breaker, in a single wrapper frame.
+    The breaker sees one success or failure per call, after retries, the same
+    as stacking @breaker over @retry_with_backoff.
+    """
+    if jitter not in JITTER_MODES:
+        raise ValueError(f"Unknown jitter mode: {jitter!r}")
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs) -> Any:
+            if breaker is not None and not breaker.allow():
+                raise CircuitOpenError(f"Circuit breaker is {breaker.state} for {func.__name__}")
+            
+            for attempt in range(max_attempts):
+                try:
+                    result = func(*args, **kwargs)
+                except exceptions as e:
+                    if attempt == max_attempts - 1:
+                        logger.error(f"Function {func.__name__} failed after {max_attempts} attempts: {e}")
+                        if breaker is not None:
+                            breaker._on_failure()
+                        raise
+                    
+                    cap = min(base_delay * (backoff_multiplier ** attempt), max_delay)
+                    delay = jittered_delay(cap, jitter)
+                    logger.warning(f"Function {func.__name__} failed (attempt {attempt + 1}/{max_attempts}): {e}. Retrying in {delay:.1f}s (cap {cap:.1f}s)")
+                    time.sleep(delay)
+                except Exception:
+                    if breaker is not None:
+                        breaker._on_failure()
+                    raise
+                except BaseException:
+                    if breaker is not None:
+                        breaker._release_probe()
+                    raise
+                else:
+                    if breaker is not None:
+                        breaker._on_success()
+                    return result
         
-        if self.failure_count >= self.failure_threshold:
-            self.state = 'OPEN'
-            logger.warning(f"Circuit breaker opened after {self.failure_count} failures")
+        return wrapper
+    return decorator
 
 # Global circuit breaker instances for different services
 news_api_circuit_breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=300)  # 5 min recovery
@@ -1,9 +1,12 @@
 """
 Newsletter Scheduler - Sends daily newsletters at 8 AM
 """
+import asyncio
+import random
 import schedule
 import time
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import logging
 from sheets import get_all_verified_subscribers
@@ -15,15 +18,109 @@ from config import TOPICS, BASE_URL
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def send_daily_newsletters():
+# Subscribers processed at once; bounds concurrent Perplexity and SMTP traffic
+_MAX_CONCURRENT_SUBSCRIBERS = 10
+
+# Dedicated threads for news fetches, so slow Perplexity calls neither queue
+# behind nor crowd out the SMTP sends on asyncio's default executor
+_NEWS_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="news")
+
+# Each replica picks a random start within this many seconds after 08:00, so
+# restarted replicas don't all hit Perplexity and Gmail at 08:00:00 together.
+# Subscribers get the newsletter sometime between 08:00 and 08:05.
+_START_JITTER_SECONDS = 300
+
+# Spellings of a ticked topic cell, so rows are checked without str()/upper()
+_TRUE_SET = frozenset({"TRUE", "True", "true", True})
+
+def _subscriber_prefs(subscriber):
+    """(email, selected_topics, max_items) for a sheet row, or None to skip it"""
+    email = subscriber.get('Email', '').strip()
+    if not email:
+        return None
+    
+    # Get subscriber's preferences
+    selected_topics = tuple(topic for topic in TOPICS if subscriber.get(topic) in _TRUE_SET)
+    
+    if not selected_topics:
+        logger.warning(f"⚠️ No topics selected for {email}")
+        return None
+    
+    # Get max items preference
+    max_items = int(subscriber.get('Max_items', '3') or 3)
+    return email, selected_topics, max_items
+
+async def _fetch_topic_news(prefs):
     """
-    Send daily newsletters to all verified subscribers
+    Fetch each topic once for the whole run, at the largest max_items any
+    subscriber asked for; subscribers then take a slice of the shared list.
+    """
+    needed = {}
+    for _, selected_topics, max_items in prefs:
+        for topic in selected_topics:
+            needed[topic] = max(needed.get(topic, 0), max_items)
+    
+    topics = list(needed)
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(
+        *(loop.run_in_executor(_NEWS_POOL, fetch_news_perplexity, topic, needed[topic]) for topic in topics),
+        return_exceptions=True,
+    )
+    topic_news = {}
+    for topic, result in zip(topics, results):
+        if isinstance(result, BaseException):
+            logger.error(f"Failed to fetch news for {topic}: {result}")
+            result = []
+        topic_news[topic] = result
+    return topic_news
+
+async def _send_to_subscriber(email, selected_topics, max_items, topic_news, sem):
+    """
+    Build and send one subscriber's newsletter. Returns True when sent,
+    False when sending failed and None when the subscriber was skipped.
+    """
+    async with sem:
+        try:
+            all_news = {
+                topic: topic_news[topic][:max_items]
+                for topic in selected_topics
+                if topic_news.get(topic)
+            }
+            
+            if not all_news:
+                logger.warning(f"⚠️ No news available for {email}")
+                return None
+            
+            # Build HTML newsletter
+            html_content = build_html(all_news, BASE_URL)
+            
+            # Send email
+            subject = f"Your Daily Digest - {', '.join(selected_topics)}"
+            success = await asyncio.to_thread(send_email, email, subject, html_content)
+            
+            if success:
+                logger.info(f"✅ Newsletter sent to {email}")
+            else:
+                logger.error(f"❌ Failed to send newsletter to {email}")
+            
+            # Small delay to avoid overwhelming email servers
+            await asyncio.sleep(1)
+            return success
+            
+        except Exception as e:
+            logger.error(f"❌ Error processing subscriber {email}: {e}")
+            return False
+
+async def send_daily_newsletters_async():
+    """
+    Send daily newsletters to all verified subscribers, up to
+    _MAX_CONCURRENT_SUBSCRIBERS at a time
     """
     try:
         logger.info("🕗 Starting daily newsletter sending...")
         
         # Get all verified subscribers
-        subscribers = get_all_verified_subscribers()
+        subscribers = await asyncio.to_thread(get_all_verified_subscribers)
         
         if not subscribers:
             logger.info("📭 No verified subscribers found")
@@ -31,79 +128,51 @@ def send_daily_newsletters():
         
         logger.info(f"📧 Found {len(subscribers)} verified subscribers")
         
-        sent_count = 0
+        prefs = []
         failed_count = 0
-        
         for subscriber in subscribers:
             try:
-                email = subscriber.get('Email', '').strip()
-                if not email:
-                    continue
-                
-                # Get subscriber's preferences
-                selected_topics = []
-                for topic in TOPICS:
-                    if str(subscriber.get(topic, '')).upper() == 'TRUE':
-                        selected_topics.append(topic)
-                
-                if not selected_topics:
-                    logger.warning(f"⚠️ No topics selected for {email}")
-                    continue
-                
-                # Get max items preference
-                max_items = int(subscriber.get('Max_items', '3') or 3)
-                
-                # Fetch news for selected topics using Perplexity
-                all_news = {}
-                for topic in selected_topics:
-                    try:
-                        news = fetch_news_perplexity(topic, max_items)
-                        if news:
-                            all_news[topic] = news
-                    except Exception as e:
-                        logger.error(f"❌ Failed to fetch news for {topic}: {e}")
-                        continue
-                
-                if not all_news:
-                    logger.warning(f"⚠️ No news available for {email}")
-                    continue
-                
-                # Build HTML newsletter
-                html_content = build_html(all_news, BASE_URL)
-                
-                # Send email
-                subject = f"Your Daily Digest - {', '.join(selected_topics)}"
-                success = send_email(email, subject, html_content)
-                
-                if success:
-                    sent_count += 1
-                    logger.info(f"✅ Newsletter sent to {email}")
-                else:
-                    failed_count += 1
-                    logger.error(f"❌ Failed to send newsletter to {email}")
-                
-                # Small delay to avoid overwhelming email servers
-                time.sleep(1)
-                
+                subscriber_prefs = _subscriber_prefs(subscriber)
             except Exception as e:
                 failed_count += 1
-                logger.error(f"❌ Error processing subscriber {email}: {e}")
+                logger.error(f"❌ Error processing subscriber {subscriber.get('Email', '')}: {e}")
                 continue
+            if subscriber_prefs:
+                prefs.append(subscriber_prefs)
+        
+        # One Perplexity fetch per topic, shared by every subscriber
+        topic_news = await _fetch_topic_news(prefs)
+        
+        sem = asyncio.Semaphore(_MAX_CONCURRENT_SUBSCRIBERS)
+        results = await asyncio.gather(
+            *(_send_to_subscriber(*p, topic_news, sem) for p in prefs),
+            return_exceptions=True,
+        )
+        sent_count = sum(1 for result in results if result is True)
+        failed_count += sum(1 for result in results if result is False or isinstance(result, BaseException))
         
         logger.info(f"📊 Newsletter sending complete: {sent_count} sent, {failed_count} failed")
         
     except Exception as e:
         logger.error(f"❌ Critical error in daily newsletter sending: {e}")
 
+def send_daily_newsletters():
+    """
+    Send daily newsletters to all verified subscribers
+    """
+    asyncio.run(send_daily_newsletters_async())
+
 def start_scheduler():
     """
     Start the newsletter scheduler in a background thread
     """
     try:
-        # Schedule daily newsletter at 8:00 AM
-        schedule.every().day.at("08:00").do(send_daily_newsletters)
+        # Schedule daily newsletter at 8:00 AM plus this replica's offset
+        minutes, seconds = divmod(random.randint(0, _START_JITTER_SECONDS), 60)
+        send_at = f"08:{minutes:02d}:{seconds:02d}"
+        schedule.every().day.at(send_at).do(send_daily_newsletters)
         
-        logger.info("⏰ Newsletter scheduler started - Daily newsletters at 8:00 AM")
+        logger.info(f"⏰ Newsletter scheduler started - Daily newsletters at {send_at}")
         
         # Run scheduler in background
         def run_scheduler():
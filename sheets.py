@@ -1,11 +1,31 @@
 import time
 import json
-from datetime import datetime
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import List, Optional
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
-from config import SERVICE_JSON, SCOPE, SHEET_ID, DESIRED_HEADERS, GOOGLE_SERVICE_JSON
+from oauth2client.client import HttpAccessTokenRefreshError
+from config import SERVICE_JSON, SCOPE, SHEET_ID, DESIRED_HEADERS, GOOGLE_SERVICE_JSON, TOPICS
+from flask import g, has_app_context
+from cache import invalidate_subscriber, email_key
+from retry_utils import jittered_delay
 
-def open_sheet_with_retry(retries=3, backoff=2):
+# Credential-refresh failures that mean the cached client has to be rebuilt
+try:
+    from google.auth.exceptions import RefreshError
+    _AUTH_ERRORS = (RefreshError, HttpAccessTokenRefreshError)
+except ImportError:
+    _AUTH_ERRORS = (HttpAccessTokenRefreshError,)
+
+# Authorized client and worksheet, reused across calls so the key file is
+# parsed once and gspread's HTTP session keeps its connections open
+_CLIENT = None
+_SHEET = None
+_client_lock = threading.Lock()
+
+def _authorize():
     # Use environment variable if available (for Render), otherwise use file
     if GOOGLE_SERVICE_JSON:
         creds = ServiceAccountCredentials.from_json_keyfile_dict(
@@ -13,23 +33,66 @@ def open_sheet_with_retry(retries=3, backoff=2):
         )
     else:
         creds = ServiceAccountCredentials.from_json_keyfile_name(SERVICE_JSON, SCOPE)
+    return gspread.authorize(creds)
+
+def reset_sheet_client():
+    """Forget the cached client and worksheet; the next open re-authorizes"""
+    global _CLIENT, _SHEET
+    with _client_lock:
+        _CLIENT = None
+        _SHEET = None
+
+def open_sheet_with_retry(retries=3, backoff=2):
+    global _CLIENT, _SHEET
+    sheet = _SHEET
+    if sheet is not None:
+        return sheet
     
-    client = gspread.authorize(creds)
     last_err = None
     for i in range(retries):
         try:
-            return client.open_by_key(SHEET_ID).sheet1
+            with _client_lock:
+                if _SHEET is None:
+                    if _CLIENT is None:
+                        _CLIENT = _authorize()
+                    _SHEET = _CLIENT.open_by_key(SHEET_ID).sheet1
+                return _SHEET
         except Exception as e:
             last_err = e
-            time.sleep(backoff ** i)
+            if isinstance(e, _AUTH_ERRORS):
+                reset_sheet_client()
+            if i < retries - 1:
+                time.sleep(jittered_delay(backoff ** i))
     raise last_err
 
+# Clean header row per spreadsheet, so ensure_headers can skip re-reading row 1
+_HEADERS_CACHE = {}  # spreadsheet id -> (monotonic expiry, headers)
+_HEADERS_TTL = 300
+
+def _headers_key(sheet):
+    return getattr(sheet, "spreadsheet_id", SHEET_ID)
+
+def _forget_headers(sheet):
+    """Drop the cached header row after writing row 1 directly"""
+    _HEADERS_CACHE.pop(_headers_key(sheet), None)
+
 def ensure_headers(sheet):
     """Ensure sheet has at least DESIRED_HEADERS; append any missing to the right."""
+    key = _headers_key(sheet)
+    cached = _HEADERS_CACHE.get(key)
+    if cached and time.monotonic() < cached[0]:
+        return list(cached[1])
+    
+    final_headers = _clean_headers(sheet)
+    _HEADERS_CACHE[key] = (time.monotonic() + _HEADERS_TTL, final_headers)
+    return list(final_headers)
+
+def _clean_headers(sheet):
+    """Read row 1 and rewrite it only if it isn't already the clean header list"""
     headers = sheet.row_values(1)
     if not headers:
         sheet.update("A1", [DESIRED_HEADERS])
-        return DESIRED_HEADERS
+        return list(DESIRED_HEADERS)
     
     # Remove duplicates and empty strings from headers while preserving order
     seen = set()
@@ -52,137 +115,222 @@ def ensure_headers(sheet):
         if header not in DESIRED_HEADERS:
             final_headers.append(header)
     
-    # Update the header row to ensure clean headers
-    sheet.update("A1", [final_headers])
+    # Update the header row only when cleaning actually changed it
+    if final_headers != headers:
+        sheet.update("A1", [final_headers])
     return final_headers
 
-def _col_index(headers, name):
+@dataclass
+class SheetSnapshot:
+    """
+    The whole worksheet from a single get_all_values() call, so a full pass
+    over the subscribers costs one round trip.
+    """
+    headers: List[str]
+    rows: List[List[str]]
+
+    @classmethod
+    def load(cls, sheet, headers: Optional[List[str]] = None) -> "SheetSnapshot":
+        values = sheet.get_all_values()
+        if headers is None:
+            headers = values[0] if values else []
+        return cls(headers, values[1:])
+
+    def records(self):
+        """All data rows as {header: value} dicts"""
+        headers = self.headers
+        return [
+            {h: (values[i] if i < len(values) else "") for i, h in enumerate(headers)}
+            for values in self.rows
+        ]
+
+def load_snapshot(sheet=None) -> SheetSnapshot:
+    """Snapshot of the subscriber sheet with clean headers"""
+    if sheet is None:
+        sheet = open_sheet_with_retry()
     try:
-        return headers.index(name) + 1
-    except ValueError:
+        return SheetSnapshot.load(sheet, ensure_headers(sheet))
+    except _AUTH_ERRORS:
+        # Cached credentials could not be refreshed; re-authorize next time
+        reset_sheet_client()
+        raise
+
+# email_key(email) -> sheet row, rebuilt from the Email column at most every
+# _EMAIL_INDEX_TTL seconds. Rows are checked against the email when read, so
+# an entry gone stale (another worker deleted or added rows) only costs a rebuild.
+_EMAIL_INDEX_TTL = 30
+_email_index = {}
+_email_index_expires = 0.0
+_email_index_lock = threading.Lock()
+
+def _build_email_index(sheet, headers):
+    email_col = headers.index("Email") + 1
+    index = {}
+    for idx, value in enumerate(sheet.col_values(email_col)[1:], start=2):
+        key = email_key(value)
+        if key:
+            index.setdefault(key, idx)  # first match wins, as with the old scan
+    return index
+
+def _indexed_row(sheet, headers, key: str, refresh: bool = False):
+    """(row for key or None, whether the index was just rebuilt)"""
+    global _email_index, _email_index_expires
+    with _email_index_lock:
+        rebuilt = refresh or time.monotonic() >= _email_index_expires
+        if rebuilt:
+            _email_index = _build_email_index(sheet, headers)
+            _email_index_expires = time.monotonic() + _EMAIL_INDEX_TTL
+        return _email_index.get(key), rebuilt
+
+def _forget_email_index():
+    """Rows moved (append/delete); rebuild the index on the next lookup"""
+    global _email_index_expires
+    _email_index_expires = 0.0
+
+def _locate(sheet, headers, email: str):
+    """(row_idx, record) for email via the cached index, or (None, None)"""
+    key = email_key(email)
+    row_idx, rebuilt = _indexed_row(sheet, headers, key)
+    while True:
+        if row_idx:
+            values = sheet.row_values(row_idx)
+            record = {h: (values[i] if i < len(values) else "") for i, h in enumerate(headers)}
+            if email_key(record.get("Email")) == key:
+                return row_idx, record
+        if rebuilt:
+            return None, None
+        row_idx, rebuilt = _indexed_row(sheet, headers, key, refresh=True)
+
+def _lookup(email: str):
+    """
+    (sheet, headers, row_idx, record) for email, from one row_values read
+    located through the email index.
+    """
+    sheet = open_sheet_with_retry()
+    try:
+        headers = ensure_headers(sheet)
+        row_idx, record = _locate(sheet, headers, email)
+    except _AUTH_ERRORS:
+        reset_sheet_client()
+        raise
+    return sheet, headers, row_idx, record
+
+def _write(op, *args):
+    """Run one sheet write, dropping the cached client if its credentials expired"""
+    try:
+        return op(*args)
+    except _AUTH_ERRORS:
+        reset_sheet_client()
+        raise
+
+def _request_memo():
+    """Per-request is_verified results, or None outside a Flask app context"""
+    if not has_app_context():
         return None
+    return g.setdefault("_verified_cache", {})
+
+def _invalidate(email: str):
+    """Forget cached state for email after its row was written"""
+    invalidate_subscriber(email)
+    memo = _request_memo()
+    if memo is not None:
+        memo.pop(email_key(email), None)
+
+def _topic_flags(selected_topics) -> dict:
+    """{topic: "TRUE"/"FALSE"} for every topic column"""
+    selected = frozenset(selected_topics)
+    return {topic: "TRUE" if topic in selected else "FALSE" for topic in TOPICS}
 
 def upsert_subscriber(email: str, selected_topics: list, max_items: int = 3):
     """
     If 'Email' exists, update row; else append. No Name field.
     Returns ("updated"/"created", row_index or None)
     """
-    sheet = open_sheet_with_retry()
-    headers = ensure_headers(sheet)
+    # Find existing by email (case-insensitive)
+    sheet, headers, idx, _ = _lookup(email)
 
     now_iso = datetime.utcnow().isoformat(timespec="seconds") + "Z"
     row_dict = {
         "Email": email,
-        "Technology": "TRUE" if "Technology" in selected_topics else "FALSE",
-        "Sports":     "TRUE" if "Sports" in selected_topics else "FALSE",
-        "Politics":   "TRUE" if "Politics" in selected_topics else "FALSE",
-        "Finance":    "TRUE" if "Finance" in selected_topics else "FALSE",
+        **_topic_flags(selected_topics),
         "Max_items":  str(max_items),
         "Timestamp":  now_iso,
     }
 
-    email_col = _col_index(headers, "Email")
-    if not email_col:
-        headers = ensure_headers(sheet)
-        email_col = _col_index(headers, "Email")
-
-    # Find existing by email (case-insensitive)
-    try:
-        # Use get_all_records with expected headers to avoid duplicate header issues
-        all_records = sheet.get_all_records(expected_headers=headers)
-        for idx, record in enumerate(all_records, start=2):
-            if (record.get("Email", "") or "").strip().lower() == email.strip().lower():
-                row_update = [row_dict.get(h, "") for h in headers]
-                sheet.update(f"A{idx}", [row_update])   # update whole row from A{idx}
-                return "updated", idx
-    except Exception as e:
-        print(f"⚠️ Error with get_all_records, falling back to col_values: {e}")
-        # Fallback to the original method
-        email_cells = sheet.col_values(email_col)[1:]  # skip header
-        for idx, cell_val in enumerate(email_cells, start=2):
-            if (cell_val or "").strip().lower() == email.strip().lower():
-                row_update = [row_dict.get(h, "") for h in headers]
-                sheet.update(f"A{idx}", [row_update])   # update whole row from A{idx}
-                return "updated", idx
+    if idx:
+        row_update = [row_dict.get(h, "") for h in headers]
+        _write(sheet.update, f"A{idx}", [row_update])   # update whole row from A{idx}
+        _invalidate(email)
+        return "updated", idx
 
     new_row = [row_dict.get(h, "") for h in headers]
     sheet.append_row(new_row)
+    _forget_email_index()
+    _invalidate(email)
     return "created", None
 
 # --- New helpers for OTP + management flows ---
-def _find_row_by_email(sheet, headers, email: str):
-    email_col = _col_index(headers, "Email")
-    if not email_col:
-        headers = ensure_headers(sheet)
-        email_col = _col_index(headers, "Email")
-    email_cells = sheet.col_values(email_col)[1:]
-    for idx, cell_val in enumerate(email_cells, start=2):
-        if (cell_val or "").strip().lower() == email.strip().lower():
-            return idx
-    return None
-
 def get_subscriber(email: str):
-    sheet = open_sheet_with_retry()
-    headers = ensure_headers(sheet)
-    row_idx = _find_row_by_email(sheet, headers, email)
+    _, headers, row_idx, record = _lookup(email)
     if not row_idx:
         return None, None, headers
-    values = sheet.row_values(row_idx)
-    record = {h: (values[i] if i < len(values) else "") for i, h in enumerate(headers)}
     return record, row_idx, headers
 
 def is_verified(email: str) -> bool:
+    """
+    Memoized for the current request, so repeated checks of one email
+    within a request read the sheet once.
+    """
+    key = email_key(email)
+    memo = _request_memo()
+    if memo is not None and key in memo:
+        return memo[key]
     rec, _, _ = get_subscriber(email)
-    return bool(rec and str(rec.get("Verified", "")).strip().upper() == "TRUE")
+    verified = bool(rec and str(rec.get("Verified", "")).strip().upper() == "TRUE")
+    if memo is not None:
+        memo[key] = verified
+    return verified
 
 def set_pending_subscription(email: str, selected_topics: list, max_items: int, otp_code: str, otp_expires_iso: str):
-    sheet = open_sheet_with_retry()
-    headers = ensure_headers(sheet)
+    sheet, headers, row_idx, _ = _lookup(email)
     now_iso = datetime.utcnow().isoformat(timespec="seconds") + "Z"
     row_dict = {
         "Email": email,
-        "Technology": "TRUE" if "Technology" in selected_topics else "FALSE",
-        "Sports":     "TRUE" if "Sports" in selected_topics else "FALSE",
-        "Politics":   "TRUE" if "Politics" in selected_topics else "FALSE",
-        "Finance":    "TRUE" if "Finance" in selected_topics else "FALSE",
+        **_topic_flags(selected_topics),
         "Max_items":  str(max_items),
         "Timestamp":  now_iso,
         "Verified":   "FALSE",
         "OTP_Code":   otp_code,
         "OTP_Expires": otp_expires_iso,
     }
-    row_idx = _find_row_by_email(sheet, headers, email)
     if row_idx:
         row_update = [row_dict.get(h, "") for h in headers]
-        sheet.update(f"A{row_idx}", [row_update])
+        _write(sheet.update, f"A{row_idx}", [row_update])
+        _invalidate(email)
         return "updated", row_idx
     else:
         new_row = [row_dict.get(h, "") for h in headers]
         sheet.append_row(new_row)
+        _forget_email_index()
+        _invalidate(email)
         return "created", None
 
 def verify_otp(email: str, otp_code: str) -> bool:
-    sheet = open_sheet_with_retry()
-    headers = ensure_headers(sheet)
-    row_idx = _find_row_by_email(sheet, headers, email)
+    sheet, headers, row_idx, record = _lookup(email)
     if not row_idx:
         return False
-    values = sheet.row_values(row_idx)
-    record = {h: (values[i] if i < len(values) else "") for i, h in enumerate(headers)}
     if (record.get("OTP_Code", "") or "").strip() != (otp_code or "").strip():
         return False
-    expires = (record.get("OTP_Expires", "") or "").strip()
+    # otp_expiry_iso writes a trailing Z, which fromisoformat only accepts from 3.11
+    expires = (record.get("OTP_Expires", "") or "").strip().removesuffix("Z")
     try:
-        # Accept both with and without trailing Z
-        exp = expires.rstrip("Z")
-        from datetime import datetime
-        fmt = "%Y-%m-%dT%H:%M:%S"
-        if "." in exp:
-            fmt = "%Y-%m-%dT%H:%M:%S.%f"
-        exp_dt = datetime.fromisoformat(exp)
-        if exp_dt < datetime.utcnow():
-            return False
-    except Exception:
+        exp_dt = datetime.fromisoformat(expires)
+    except ValueError:
+        return False
+    if exp_dt.tzinfo is not None:
+        # Offset-bearing values (e.g. +00:00) compare as naive UTC like the rest
+        exp_dt = exp_dt.astimezone(timezone.utc).replace(tzinfo=None)
+    if exp_dt < datetime.utcnow():
         return False
 
     # Mark verified and clear OTP
@@ -190,41 +338,33 @@ def verify_otp(email: str, otp_code: str) -> bool:
     record["OTP_Code"] = ""
     record["OTP_Expires"] = ""
     row_update = [record.get(h, "") for h in headers]
-    sheet.update(f"A{row_idx}", [row_update])
+    _write(sheet.update, f"A{row_idx}", [row_update])
+    _invalidate(email)
     return True
 
 def update_preferences(email: str, selected_topics: list, max_items: int = 3):
-    sheet = open_sheet_with_retry()
-    headers = ensure_headers(sheet)
-    row_idx = _find_row_by_email(sheet, headers, email)
+    sheet, headers, row_idx, record = _lookup(email)
     if not row_idx:
         return False
-    values = sheet.row_values(row_idx)
-    record = {h: (values[i] if i < len(values) else "") for i, h in enumerate(headers)}
-    record["Technology"] = "TRUE" if "Technology" in selected_topics else "FALSE"
-    record["Sports"] = "TRUE" if "Sports" in selected_topics else "FALSE"
-    record["Politics"] = "TRUE" if "Politics" in selected_topics else "FALSE"
-    record["Finance"] = "TRUE" if "Finance" in selected_topics else "FALSE"
+    record.update(_topic_flags(selected_topics))
     record["Max_items"] = str(max_items)
     row_update = [record.get(h, "") for h in headers]
-    sheet.update(f"A{row_idx}", [row_update])
+    _write(sheet.update, f"A{row_idx}", [row_update])
+    _invalidate(email)
     return True
 
 def set_otp(email: str, otp_code: str, otp_expires_iso: str) -> bool:
     """Update or create a row for email with a fresh OTP (keeps existing prefs)."""
-    sheet = open_sheet_with_retry()
-    headers = ensure_headers(sheet)
-    row_idx = _find_row_by_email(sheet, headers, email)
+    sheet, headers, row_idx, record = _lookup(email)
     now_iso = datetime.utcnow().isoformat(timespec="seconds") + "Z"
     if row_idx:
-        values = sheet.row_values(row_idx)
-        record = {h: (values[i] if i < len(values) else "") for i, h in enumerate(headers)}
         record["Verified"] = "FALSE"
         record["OTP_Code"] = otp_code
         record["OTP_Expires"] = otp_expires_iso
         record["Timestamp"] = now_iso
         row_update = [record.get(h, "") for h in headers]
-        sheet.update(f"A{row_idx}", [row_update])
+        _write(sheet.update, f"A{row_idx}", [row_update])
+        _invalidate(email)
         return True
     # If no row, create minimal row
     row_dict = {h: "" for h in headers}
@@ -235,14 +375,14 @@ def set_otp(email: str, otp_code: str, otp_expires_iso: str) -> bool:
     row_dict["Timestamp"] = now_iso
     new_row = [row_dict.get(h, "") for h in headers]
     sheet.append_row(new_row)
+    _forget_email_index()
+    _invalidate(email)
     return True
 
 def unsubscribe_user(email):
     """Remove user from the newsletter."""
     try:
-        sheet = open_sheet_with_retry()
-        headers = ensure_headers(sheet)
-        row_idx = _find_row_by_email(sheet, headers, email)
+        sheet, _, row_idx, _ = _lookup(email)
         
         if row_idx:
             # Log the deletion for audit purposes
@@ -250,7 +390,9 @@ def unsubscribe_user(email):
             logger = logging.getLogger(__name__)
             logger.info(f"Deleting user subscription: {email} (row {row_idx})")
             
-            sheet.delete_rows(row_idx)
+            _write(sheet.delete_rows, row_idx)
+            _forget_email_index()
+            _invalidate(email)
             return True
         else:
             import logging
@@ -274,12 +416,14 @@ def deactivate_subscription(email):
             headers.append("Active")
             sheet.update("A1", [headers])
             # Refresh headers after adding new column
+            _forget_headers(sheet)
             headers = ensure_headers(sheet)
         
-        row_idx = _find_row_by_email(sheet, headers, email)
+        row_idx, _ = _locate(sheet, headers, email)
         if row_idx:
             active_col = headers.index("Active") + 1
-            sheet.update_cell(row_idx, active_col, "FALSE")
+            _write(sheet.update_cell, row_idx, active_col, "FALSE")
+            _invalidate(email)
             
             # Log the deactivation for audit purposes
             import logging
@@ -309,12 +453,14 @@ def reactivate_subscription(email):
             headers.append("Active")
             sheet.update("A1", [headers])
             # Refresh headers after adding new column
+            _forget_headers(sheet)
             headers = ensure_headers(sheet)
         
-        row_idx = _find_row_by_email(sheet, headers, email)
+        row_idx, _ = _locate(sheet, headers, email)
         if row_idx:
             active_col = headers.index("Active") + 1
-            sheet.update_cell(row_idx, active_col, "TRUE")
+            _write(sheet.update_cell, row_idx, active_col, "TRUE")
+            _invalidate(email)
             
             # Log the reactivation for audit purposes
             import logging
@@ -338,8 +484,7 @@ def get_all_verified_subscribers():
     Get all verified and active subscribers
     """
     try:
-        headers = ensure_headers()
-        records = sheet.get_all_records(expected_headers=headers)
+        records = load_snapshot().records()
         
         verified_subscribers = []
         for record in records:
@@ -3,15 +3,26 @@ Utility functions for validation and security
 """
 import re
 import logging
+import itertools
+import secrets
+import threading
+from collections import deque
 from email_validator import validate_email, EmailNotValidError
 from functools import wraps
 from flask import request, jsonify
 import time
+from datetime import datetime, timedelta
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Compiled once; these run on every form field of every request
+_TAG_RE = re.compile(r'<[^>]*>')
+# \A...\Z rather than ^...$: $ also matches before a trailing newline,
+# and re.ASCII keeps \d to 0-9 instead of any Unicode digit
+_OTP_RE = re.compile(r'\A\d{6}\Z', re.ASCII)
+
 def validate_email_address(email):
     """
     Robust email validation using email-validator library
@@ -48,7 +59,7 @@ def sanitize_input(text, max_length=255):
     text = str(text).strip()[:max_length]
     
     # Remove potential HTML/script tags
-    text = re.sub(r'<[^>]*>', '', text)
+    text = _TAG_RE.sub('', text)
     
     return text
 
@@ -65,8 +76,20 @@ def log_security_event(event_type, details, request_info=None):
     logger.warning(f"SECURITY EVENT: {event_type} - {details} - IP: {request_info['ip']}")
 
 # Simple in-memory rate limiting (for basic protection)
-# In production, use Redis-based rate limiting
-_rate_limit_storage = {}
+# In production, use Redis-based rate limiting (e.g. INCR + EXPIRE per IP and window)
+# Sharded by IP, each shard {client ip: deque of request times, oldest first}
+# behind its own lock, so concurrent requests from different IPs rarely contend
+_RATE_LIMIT_SHARDS = 16
+_rate_limit_shards = [(threading.Lock(), {}) for _ in range(_RATE_LIMIT_SHARDS)]
+_SWEEP_EVERY = 1000  # requests between sweeps for IPs that have gone quiet
+_request_counter = itertools.count(1)
+
+def _sweep_rate_limits(cutoff_time):
+    """Forget IPs whose newest request is already outside the window"""
+    for lock, storage in _rate_limit_shards:
+        with lock:
+            for ip in [ip for ip, q in storage.items() if not q or q[-1] <= cutoff_time]:
+                del storage[ip]
 
 def simple_rate_limit(max_requests=50, window_seconds=300):  # Increased for testing
     """
@@ -77,27 +100,30 @@ def simple_rate_limit(max_requests=50, window_seconds=300):  # Increased for tes
         def decorated_function(*args, **kwargs):
             client_ip = request.remote_addr
             current_time = time.time()
-            
-            # Clean old entries
             cutoff_time = current_time - window_seconds
-            _rate_limit_storage[client_ip] = [
-                timestamp for timestamp in _rate_limit_storage.get(client_ip, [])
-                if timestamp > cutoff_time
-            ]
             
-            # Check rate limit
-            requests_in_window = len(_rate_limit_storage.get(client_ip, []))
+            lock, storage = _rate_limit_shards[hash(client_ip) % _RATE_LIMIT_SHARDS]
+            with lock:
+                # Clean old entries: timestamps are in order, so drop from the left
+                q = storage.setdefault(client_ip, deque())
+                while q and q[0] <= cutoff_time:
+                    q.popleft()
+                
+                # Check rate limit
+                requests_in_window = len(q)
+                allowed = requests_in_window < max_requests
+                if allowed:
+                    # Add current request
+                    q.append(current_time)
             
-            if requests_in_window >= max_requests:
+            if not allowed:
                 log_security_event("RATE_LIMIT_EXCEEDED", f"IP: {client_ip}, Requests: {requests_in_window}")
                 return jsonify({
                     'error': 'Rate limit exceeded. Please try again later.'
                 }), 429
             
-            # Add current request
-            if client_ip not in _rate_limit_storage:
-                _rate_limit_storage[client_ip] = []
-            _rate_limit_storage[client_ip].append(current_time)
+            if next(_request_counter) % _SWEEP_EVERY == 0:
+                _sweep_rate_limits(cutoff_time)
             
             return f(*args, **kwargs)
         return decorated_function
@@ -107,10 +133,16 @@ def generate_secure_otp():
     """
     Generate a secure 6-digit OTP
     """
-    import secrets
-    # 6-digit OTP (100000 to 999999)
+    # 6-digit OTP (100000 to 999999); one randbelow call is faster than six
+    # secrets.choice draws and, unlike urandom bytes % n, stays uniform
     return f"{secrets.randbelow(900000) + 100000}"
 
+def otp_expiry_iso(minutes=10):
+    """
+    OTP expiry timestamp as ISO-8601 UTC with seconds precision, e.g. 2025-01-01T08:10:00Z
+    """
+    return (datetime.utcnow() + timedelta(minutes=minutes)).strftime("%Y-%m-%dT%H:%M:%SZ")
+
 def validate_otp_format(otp):
     """
     Validate OTP format - must be exactly 6 digits
@@ -119,4 +151,4 @@ def validate_otp_format(otp):
         return False
     
     # Must be exactly 6 digits
-    return bool(re.match(r'^\d{6}$', otp))
+    return _OTP_RE.match(otp) is not None
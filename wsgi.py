@@ -0,0 +1,15 @@
+"""
+WSGI entry point for production servers:
+    gunicorn -k gevent -w 2 --worker-connections 200 wsgi:application
+"""
+# Patch sockets before anything imports requests/smtplib/redis so their
+# blocking I/O yields to other requests instead of stalling the worker
+try:
+    from gevent import monkey
+    monkey.patch_all()
+except ImportError:
+    pass
+
+from app import app
+
+application = app